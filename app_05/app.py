@@ -2,37 +2,54 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 
-# Load some example data
-df = px.data.gapminder().query("year == 2007")
+
+# Load some example data once per process, partitioned by continent
+@st.cache_resource
+def load_partitions():
+    df = px.data.gapminder().query("year == 2007")
+    df = df.astype({"continent": "category", "country": "category"})
+
+    partitions = {}
+    for continent, part in df.groupby("continent", observed=True, sort=False):
+        part = part.assign(country=part["country"].cat.remove_unused_categories())
+
+        fig1 = px.scatter(
+            part, x="gdpPercap", y="lifeExp",
+            size="pop", color="country",
+            hover_name="country", log_x=True, size_max=60,
+            title="GDP vs Life Expectancy"
+        )
+
+        fig2 = px.bar(
+            part, x="country", y="pop",
+            title="Population by Country"
+        )
+
+        partitions[continent] = {
+            "avg_gdp": part["gdpPercap"].mean(),
+            "fig1": fig1,
+            "fig2": fig2,
+        }
+    return partitions
+
+
+partitions = load_partitions()
 
 st.title("🌍 Global Data Dashboard")
 
 # Sidebar filter
-continent = st.sidebar.selectbox("Continent", df['continent'].unique())
+continent = st.sidebar.selectbox("Continent", list(partitions))
 
-filtered_df = df[df['continent'] == continent]
+selected = partitions[continent]
 
 # KPI
-avg_gdp = filtered_df['gdpPercap'].mean()
-st.metric("Average GDP per Capita", f"${avg_gdp:,.0f}")
+st.metric("Average GDP per Capita", f"${selected['avg_gdp']:,.0f}")
 
 # Charts
-fig1 = px.scatter(
-    filtered_df, x="gdpPercap", y="lifeExp",
-    size="pop", color="country",
-    hover_name="country", log_x=True, size_max=60,
-    title="GDP vs Life Expectancy"
-)
-
-fig2 = px.bar(
-    filtered_df, x="country", y="pop",
-    title="Population by Country"
-)
-
 col1, col2 = st.columns(2)
 
 with col1:
-    st.plotly_chart(fig1, use_container_width=True)
+    st.plotly_chart(selected["fig1"], use_container_width=True)
 
 with col2:
-    st.plotly_chart(fig2, use_container_width=True)
+    st.plotly_chart(selected["fig2"], use_container_width=True)
@@ -1,9 +1,13 @@
 #######################
 # Import libraries
+import os
+import time
+
 import streamlit as st
 import pandas as pd
 import altair as alt
-import plotly.express as px
+import plotly.graph_objects as go
+import numpy as np
 
 #######################
 # Page configuration
@@ -67,7 +71,39 @@ st.markdown("""
 
 #######################
 # Load data
-df_reshaped = pd.read_csv('datasets/us-population-2010-2019-reshaped.csv')
+DATA_PATH = 'datasets/us-population-2010-2019-reshaped.csv'
+CACHE_PATH = 'datasets/.cache/us-population-2010-2019-reshaped.parquet'
+DATA_DTYPES = {
+    'states': 'category',
+    'states_code': 'category',
+    'id': 'int16',
+    'year': 'int16',
+    'population': 'int32',
+}
+
+# Parse the csv once per process (and once per file change), keeping a parquet copy next to it
+@st.cache_resource
+def load_data(path, cache_path, mtime):
+    start = time.perf_counter()
+    if os.path.exists(cache_path) and os.path.getmtime(cache_path) >= mtime:
+        df = pd.read_parquet(cache_path)
+        source = 'parquet cache'
+    else:
+        df = pd.read_csv(path, index_col=0, dtype=DATA_DTYPES)
+        source = 'csv'
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            df.to_parquet(cache_path)
+        except (ImportError, OSError):
+            # No parquet engine or read-only folder: keep reading the csv
+            pass
+    load_time = time.perf_counter() - start
+    memory_usage = df.memory_usage(deep=True).sum()
+    return df, source, load_time, memory_usage
+
+# Every cache derived from the data is keyed by its mtime as well, so a new csv refreshes them all
+data_mtime = os.path.getmtime(DATA_PATH)
+df_reshaped, data_source, load_time, memory_usage = load_data(DATA_PATH, CACHE_PATH, data_mtime)
 
 
 #######################
@@ -84,6 +120,10 @@ with st.sidebar:
     color_theme_list = ['blues', 'cividis', 'greens', 'inferno', 'magma', 'plasma', 'reds', 'rainbow', 'turbo', 'viridis']
     selected_color_theme = st.selectbox('Select a color theme', color_theme_list)
 
+    point_budget = st.number_input('Max points in 3D scatter', min_value=100, value=5000, step=500)
+
+    st.caption(f'Loaded {len(df_reshaped):,} rows from {data_source} in {load_time * 1000:.1f} ms · {memory_usage / 1024:.1f} KB in memory')
+
 
 #######################
 # Plots
@@ -93,7 +133,7 @@ def make_heatmap(input_df, input_y, input_x, input_color, input_color_theme):
     heatmap = alt.Chart(input_df).mark_rect().encode(
             y=alt.Y(f'{input_y}:O', axis=alt.Axis(title="Year", titleFontSize=18, titlePadding=15, titleFontWeight=900, labelAngle=0)),
             x=alt.X(f'{input_x}:O', axis=alt.Axis(title="", titleFontSize=18, titlePadding=15, titleFontWeight=900)),
-            color=alt.Color(f'max({input_color}):Q',
+            color=alt.Color(f'{input_color}:Q',
                              legend=None,
                              scale=alt.Scale(scheme=input_color_theme)),
             stroke=alt.value('black'),
@@ -106,6 +146,12 @@ def make_heatmap(input_df, input_y, input_x, input_color, input_color_theme):
     # height=300
     return heatmap
 
+# Heatmap spec: aggregate year x state server-side once, compile once per color theme
+@st.cache_resource
+def get_heatmap_spec(mtime, selected_color_theme):
+    heatmap_df = df_reshaped.groupby(['year', 'states'], observed=True, as_index=False)['population'].max()
+    return make_heatmap(heatmap_df, 'year', 'states', 'population', selected_color_theme).to_dict()
+
 # # Choropleth map
 # def make_choropleth(input_df, input_id, input_column, input_color_theme):
 #     choropleth = px.choropleth(input_df, locations=input_id, color=input_column, locationmode="USA-states",
@@ -124,17 +170,9 @@ def make_heatmap(input_df, input_y, input_x, input_color, input_color_theme):
 #     return choropleth
 
 # 3D Globe Choropleth (bubble map)
-import plotly.graph_objects as go
 
-import numpy as np
-# Remove territories and tiny regions
-
-import numpy as np
-import plotly.graph_objects as go
-
-def make_choropleth(input_df, input_id, input_column, input_color_theme):
-    # State centroids (shortened example — add all states)
-    state_centroids = {
+# State centroids, indexed by state code so they can be joined in one go
+STATE_CENTROIDS = pd.DataFrame.from_dict({
     'AL': (32.806671, -86.791130),
     'AK': (61.370716, -152.404419),
     'AZ': (33.729759, -111.431221),
@@ -185,19 +223,19 @@ def make_choropleth(input_df, input_id, input_column, input_color_theme):
     'WV': (38.491226, -80.954456),
     'WI': (44.268543, -89.616508),
     'WY': (42.755966, -107.302490)
-}
+}, orient='index', columns=['lat', 'lon'])
 
+def make_choropleth(input_df, input_id, input_column, input_color_theme):
     # ✅ Filter out Puerto Rico and DC if you don’t want them
     input_df = input_df[~input_df[input_id].isin(['PR', 'DC'])]
 
-    # Add lat/lon columns using centroids
-    input_df['lat'] = input_df[input_id].map(lambda x: state_centroids.get(x, (0, 0))[0])
-    input_df['lon'] = input_df[input_id].map(lambda x: state_centroids.get(x, (0, 0))[1])
+    # Add lat/lon columns using centroids (one vectorized join, new frame)
+    input_df = input_df.join(STATE_CENTROIDS, on=input_id)
+    input_df[['lat', 'lon']] = input_df[['lat', 'lon']].fillna(0)
 
     # Bubble size: square root scale for better visuals
     max_pop = input_df[input_column].max()
-    input_df['bubble_size'] = np.sqrt(input_df[input_column] / max_pop) * 50
-    input_df['bubble_size'] = input_df['bubble_size'].clip(lower=5)  # minimum size so tiny states show
+    input_df['bubble_size'] = (np.sqrt(input_df[input_column] / max_pop) * 50).clip(lower=5)  # minimum size so tiny states show
 
     # Create figure
     fig = go.Figure()
@@ -206,7 +244,7 @@ def make_choropleth(input_df, input_id, input_column, input_color_theme):
         go.Scattergeo(
             lon = input_df['lon'],
             lat = input_df['lat'],
-            text = input_df['states'] + '<br>Population: ' + input_df[input_column].astype(str),
+            text = input_df['states'].astype(str) + '<br>Population: ' + input_df[input_column].astype(str),
             marker = dict(
                 size = input_df['bubble_size'],
                 color = input_df[input_column],
@@ -246,6 +284,46 @@ def make_choropleth(input_df, input_id, input_column, input_color_theme):
 
     return fig
 
+@st.cache_resource
+def get_choropleth(mtime, selected_year, selected_color_theme):
+    return make_choropleth(df_reshaped[df_reshaped.year == selected_year], 'states_code', 'population', selected_color_theme)
+
+
+# 3D scatter: a single WebGL trace coloured by state code, sampled down to the point budget
+def make_scatter_3d(input_df, input_color_theme, point_budget):
+    if len(input_df) > point_budget:
+        input_df = input_df.sample(n=point_budget, random_state=0)
+
+    fig = go.Figure(
+        go.Scatter3d(
+            x = input_df['year'],
+            y = input_df['population'],
+            z = input_df['population_difference'],
+            mode = 'markers',
+            text = input_df['states'].astype(str),
+            marker = dict(
+                size = 4,
+                color = input_df['states'].cat.codes,
+                colorscale = input_color_theme,
+            ),
+            hovertemplate = '%{text}<br>Year: %{x}<br>Population: %{y}<br>Difference: %{z}<extra></extra>'
+        )
+    )
+
+    fig.update_layout(
+        title_text = 'Animated 3D Scatter: Population and Migration Over Years',
+        scene = dict(
+            xaxis_title = 'year',
+            yaxis_title = 'population',
+            zaxis_title = 'population_difference',
+        ),
+    )
+    return fig
+
+@st.cache_resource
+def get_scatter_3d(mtime, selected_color_theme, point_budget):
+    return make_scatter_3d(df_deltas.reset_index(), selected_color_theme, point_budget)
+
 
 # Donut chart
 def make_donut(input_response, input_text, input_color):
@@ -298,27 +376,41 @@ def format_number(num):
         return f'{round(num / 1000000, 1)} M'
     return f'{num // 1000} K'
 
-# Calculation year-over-year population migrations
-def calculate_population_difference(input_df, input_year):
-  selected_year_data = input_df[input_df['year'] == input_year].reset_index()
-  previous_year_data = input_df[input_df['year'] == input_year - 1].reset_index()
-  selected_year_data['population_difference'] = selected_year_data.population.sub(previous_year_data.population, fill_value=0)
-  return pd.concat([selected_year_data.states, selected_year_data.id, selected_year_data.population, selected_year_data.population_difference], axis=1).sort_values(by="population_difference", ascending=False)
+# Calculation year-over-year population migrations for every year at once, once per data file
+@st.cache_resource
+def calculate_population_deltas(_input_df, mtime):
+  deltas = _input_df.sort_values(['states', 'year'])
+  deltas['population_difference'] = deltas.groupby('states', observed=True)['population'].diff().fillna(0).astype(int)
+  deltas = deltas.set_index(['year', 'states']).sort_index()[['states_code', 'id', 'population', 'population_difference']]
+
+  # Inbound/outbound migration counts (> 50,000 either way) per year
+  by_year = deltas.groupby(level='year')
+  migrations = pd.DataFrame({
+      'inbound': (deltas.population_difference > 50000).groupby(level='year').sum(),
+      'outbound': (deltas.population_difference < -50000).groupby(level='year').sum(),
+      'states': by_year.size(),
+  })
+
+  # Biggest gain and biggest loss per year, indexed by year
+  top_movers = deltas.loc[by_year.population_difference.idxmax()].reset_index(level='states')
+  bottom_movers = deltas.loc[by_year.population_difference.idxmin()].reset_index(level='states')
+  return deltas, migrations, top_movers, bottom_movers
 
 
 #######################
 # Dashboard Main Panel
+df_deltas, df_migrations, df_top_movers, df_bottom_movers = calculate_population_deltas(df_reshaped, data_mtime)
+
 col = st.columns((1.5, 4.5, 2), gap='medium')
 
 with col[0]:
     st.markdown('#### Gains/Losses')
 
-    df_population_difference_sorted = calculate_population_difference(df_reshaped, selected_year)
-
     if selected_year > 2010:
-        first_state_name = df_population_difference_sorted.states.iloc[0]
-        first_state_population = format_number(df_population_difference_sorted.population.iloc[0])
-        first_state_delta = format_number(df_population_difference_sorted.population_difference.iloc[0])
+        first_state = df_top_movers.loc[selected_year]
+        first_state_name = first_state.states
+        first_state_population = format_number(first_state.population)
+        first_state_delta = format_number(first_state.population_difference)
     else:
         first_state_name = '-'
         first_state_population = '-'
@@ -326,9 +418,10 @@ with col[0]:
     st.metric(label=first_state_name, value=first_state_population, delta=first_state_delta)
 
     if selected_year > 2010:
-        last_state_name = df_population_difference_sorted.states.iloc[-1]
-        last_state_population = format_number(df_population_difference_sorted.population.iloc[-1])   
-        last_state_delta = format_number(df_population_difference_sorted.population_difference.iloc[-1])   
+        last_state = df_bottom_movers.loc[selected_year]
+        last_state_name = last_state.states
+        last_state_population = format_number(last_state.population)
+        last_state_delta = format_number(last_state.population_difference)
     else:
         last_state_name = '-'
         last_state_population = '-'
@@ -339,14 +432,10 @@ with col[0]:
     st.markdown('#### States Migration')
 
     if selected_year > 2010:
-        # Filter states with population difference > 50000
-        # df_greater_50000 = df_population_difference_sorted[df_population_difference_sorted.population_difference_absolute > 50000]
-        df_greater_50000 = df_population_difference_sorted[df_population_difference_sorted.population_difference > 50000]
-        df_less_50000 = df_population_difference_sorted[df_population_difference_sorted.population_difference < -50000]
-        
         # % of States with population difference > 50000
-        states_migration_greater = round((len(df_greater_50000)/df_population_difference_sorted.states.nunique())*100)
-        states_migration_less = round((len(df_less_50000)/df_population_difference_sorted.states.nunique())*100)
+        migrations = df_migrations.loc[selected_year]
+        states_migration_greater = round((migrations.inbound/migrations.states)*100)
+        states_migration_less = round((migrations.outbound/migrations.states)*100)
         donut_chart_greater = make_donut(states_migration_greater, 'Inbound Migration', 'green')
         donut_chart_less = make_donut(states_migration_less, 'Outbound Migration', 'red')
     else:
@@ -375,27 +464,15 @@ with col[0]:
 with col[1]:
     st.markdown('#### Total Population')
 
-    choropleth = make_choropleth(df_selected_year, 'states_code', 'population', selected_color_theme)
+    choropleth = get_choropleth(data_mtime, selected_year, selected_color_theme)
     st.plotly_chart(choropleth, use_container_width=True)
 
-    heatmap = make_heatmap(df_reshaped, 'year', 'states', 'population', selected_color_theme)
-    st.altair_chart(heatmap, use_container_width=True)
+    heatmap_spec = get_heatmap_spec(data_mtime, selected_color_theme)
+    st.vega_lite_chart(heatmap_spec, use_container_width=True)
 
     st.markdown('#### 3D Scatter: Year vs Population vs Migration')
     
-    # Add population_difference to df_reshaped if missing
-    # Make sure you added the population_difference to df_reshaped first!
-    df_reshaped = df_reshaped.sort_values(['states', 'year'])
-    df_reshaped['population_difference'] = df_reshaped.groupby('states')['population'].diff().fillna(0)
-
-    fig = px.scatter_3d(
-        df_reshaped,
-        x='year',
-        y='population',
-        z='population_difference',
-        color='states',
-        title='Animated 3D Scatter: Population and Migration Over Years'
-)
+    fig = get_scatter_3d(data_mtime, selected_color_theme, point_budget)
     st.plotly_chart(fig, use_container_width=True)
 
     # st.plotly_chart(fig, use_container_width=True)
@@ -2,6 +2,14 @@
 # 🟢 Full Sales Dashboard with Heatmap, Bubble & Geo Map
 # -----------------------------------------------
 
+import datetime
+import glob
+import hashlib
+import os
+import time
+
+import numpy as np
+import openpyxl  # pip install openpyxl
 import pandas as pd  # pip install pandas openpyxl
 import plotly.express as px  # pip install plotly-express
 import streamlit as st  # pip install streamlit
@@ -18,20 +26,208 @@ st.set_page_config(
 # -----------------------------------------------
 # 🟢 Load data
 # -----------------------------------------------
-@st.cache_data
-def get_data_from_excel():
-    df = pd.read_excel(
-        io="./datasets/supermarkt_sales.xlsx",
-        engine="openpyxl",
-        sheet_name="Sales",
-        skiprows=3,
-        usecols="B:R",
-        nrows=1000,
-    )
-    df["hour"] = pd.to_datetime(df["Time"], format="%H:%M:%S").dt.hour
-    return df
+DATA_PATH = "./datasets/supermarkt_sales.xlsx"
+CACHE_DIR = "./datasets/.cache"
+CHUNK_ROWS = 50_000
+# Fixed column types, so every chunk of a multi-year export has the same parquet schema
+TEXT_COLUMNS = ["Invoice ID", "Branch", "City", "Customer_type", "Gender", "Product line", "Payment"]
+NUMBER_COLUMNS = ["Unit price", "Quantity", "Tax 5%", "Total", "cogs", "gross margin percentage", "gross income", "Rating"]
+
+def file_fingerprint(path):
+    """mtime + content hash, used to name the parquet cache of a workbook."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return f"{os.stat(path).st_mtime_ns}-{digest.hexdigest()[:16]}"
+
+def time_of_day(value):
+    """Excel hands times back as time, datetime or text depending on the cell format."""
+    if isinstance(value, datetime.datetime):
+        value = value.time()
+    return None if value is None else str(value)
+
+def prepare_chunk(chunk):
+    """Normalize the column types and materialize derived columns once, at ingest time."""
+    for column in TEXT_COLUMNS:
+        chunk[column] = chunk[column].astype("string").astype(object).where(chunk[column].notna(), None)
+    for column in NUMBER_COLUMNS:
+        chunk[column] = pd.to_numeric(chunk[column], errors="coerce").astype("float64")
+    chunk["Date"] = pd.to_datetime(chunk["Date"], errors="coerce")
+    chunk["Time"] = chunk["Time"].map(time_of_day).astype(object)
+    chunk["hour"] = pd.to_timedelta(chunk["Time"], errors="coerce").dt.components.hours.astype("Int64")
+    return chunk
+
+def iter_excel_chunks(path, chunk_rows=CHUNK_ROWS):
+    """Stream the Sales sheet (header on row 4, columns B:R) in DataFrame chunks."""
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook["Sales"].iter_rows(min_row=4, min_col=2, max_col=18, values_only=True)
+        header = next(rows)
+        buffer = []
+        for row in rows:
+            if all(value is None for value in row):
+                continue
+            buffer.append(row)
+            if len(buffer) == chunk_rows:
+                yield prepare_chunk(pd.DataFrame(buffer, columns=header))
+                buffer = []
+        if buffer:
+            yield prepare_chunk(pd.DataFrame(buffer, columns=header))
+    finally:
+        workbook.close()
+
+def ingest_excel(path, cache_path):
+    """Write the sheet chunk by chunk to parquet, so only one chunk is held in memory."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        return pd.concat(iter_excel_chunks(path), ignore_index=True)
+
+    column_types = {
+        **{column: pa.string() for column in TEXT_COLUMNS},
+        **{column: pa.float64() for column in NUMBER_COLUMNS},
+        "Date": pa.timestamp("ns"),
+        "Time": pa.string(),
+        "hour": pa.int64(),
+    }
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    writer = None
+    try:
+        for chunk in iter_excel_chunks(path):
+            schema = pa.schema([(column, column_types[column]) for column in chunk.columns])
+            table = pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(cache_path + ".tmp", table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+    os.replace(cache_path + ".tmp", cache_path)
+    return pd.read_parquet(cache_path)
+
+@st.cache_resource
+def load_sales(path, mtime):
+    name = os.path.splitext(os.path.basename(path))[0]
+    cache_path = os.path.join(CACHE_DIR, f"{name}-{file_fingerprint(path)}.parquet")
+    if os.path.exists(cache_path):
+        return pd.read_parquet(cache_path)
+    data = ingest_excel(path, cache_path)
+    # Caches of earlier versions of the workbook are never read again
+    for stale_path in glob.glob(os.path.join(CACHE_DIR, f"{glob.escape(name)}-*.parquet")):
+        if stale_path != cache_path:
+            os.remove(stale_path)
+    return data
+
+# Every cache derived from the workbook is keyed by its mtime, so replacing the file rebuilds them all
+data_mtime = os.path.getmtime(DATA_PATH)
+
+def get_data_from_excel(mtime):
+    return load_sales(DATA_PATH, mtime)
+
+df = get_data_from_excel(data_mtime)
 
-df = get_data_from_excel()
+# -----------------------------------------------
+# 🟢 Bitmap index: one packed bitmap per filter value
+# -----------------------------------------------
+FILTER_COLUMNS = ["City", "Customer_type", "Gender"]
+
+@st.cache_resource
+def get_bitmap_index(mtime):
+    data = get_data_from_excel(mtime)
+    bitmaps = {
+        column: {
+            value: np.packbits(data[column].to_numpy() == value)
+            for value in data[column].unique()
+        }
+        for column in FILTER_COLUMNS
+    }
+    return len(data), bitmaps
+
+def filter_rows(selections):
+    """OR the bitmaps of the selected values per column, AND across columns, return row positions."""
+    n_rows, bitmaps = get_bitmap_index(data_mtime)
+    mask = np.packbits(np.ones(n_rows, dtype=bool))
+    for column, values in selections.items():
+        column_mask = np.zeros_like(mask)
+        for value in values:
+            column_mask |= bitmaps[column][value]
+        mask &= column_mask
+    return np.flatnonzero(np.unpackbits(mask, count=n_rows))
+
+# -----------------------------------------------
+# 🟢 Sales cube: City x Customer_type x Gender x Product line x hour
+# -----------------------------------------------
+CUBE_DIMENSIONS = FILTER_COLUMNS + ["Product line", "hour"]
+
+@st.cache_resource
+def get_sales_cube(mtime):
+    data = get_data_from_excel(mtime)
+    # Rows with a missing dimension (e.g. an unparsed Time) keep a cell of their own, so the KPIs count them
+    return data.groupby(by=CUBE_DIMENSIONS, dropna=False).agg(
+        Total=("Total", "sum"),
+        Transactions=("Total", "size"),
+        Rating_sum=("Rating", "sum"),
+        Rating_count=("Rating", "count"),
+    ).reset_index()
+
+def filter_cube(selections):
+    """Return the cube cells matching the sidebar selections."""
+    cube = get_sales_cube(data_mtime)
+    mask = np.ones(len(cube), dtype=bool)
+    for column, values in selections.items():
+        mask &= cube[column].isin(values).to_numpy()
+    return cube[mask]
+
+# -----------------------------------------------
+# 🟢 Segment moments: pairwise counts, means and co-moments per City/Customer_type/Gender
+# -----------------------------------------------
+CORR_COLUMNS = ["Unit price", "Quantity", "Total", "Rating"]
+
+@st.cache_resource
+def get_segment_moments(mtime):
+    """
+    Moments over pairwise-complete rows, like DataFrame.corr: a blank cell only leaves
+    its row out of the pairs involving that column. For every column pair (i, j):
+    n[i, j] rows where both are present, mean[i, j] and m2[i, j] the mean and sum of
+    squared deviations of column i over those rows, and comoment[i, j] their co-moment.
+    """
+    data = get_data_from_excel(mtime)
+    values = data[CORR_COLUMNS].to_numpy(dtype=float)
+    moments = {}
+    for segment, rows in data.groupby(by=FILTER_COLUMNS).indices.items():
+        x = values[rows]
+        present = (~np.isnan(x)).astype(float)
+        # Shifted by the column means, so the sums of products below stay well conditioned
+        with np.errstate(invalid="ignore"):
+            shift = np.nan_to_num(np.nanmean(x, axis=0))
+        x = np.nan_to_num(x - shift)
+        n = present.T @ present
+        mean = np.divide(x.T @ present, n, out=np.zeros_like(n), where=n > 0)
+        m2 = (x ** 2).T @ present - n * mean ** 2
+        comoment = x.T @ x - n * mean * mean.T
+        moments[segment] = (n, mean + shift[:, None], m2, comoment)
+    return moments
+
+def correlation_from_moments(selections):
+    """Merge the pairwise moments of the selected segments (Chan et al.) into a correlation matrix."""
+    shape = (len(CORR_COLUMNS), len(CORR_COLUMNS))
+    n, mean, m2, comoment = np.zeros(shape), np.zeros(shape), np.zeros(shape), np.zeros(shape)
+    for segment, (n_b, mean_b, m2_b, comoment_b) in get_segment_moments(data_mtime).items():
+        if not all(value in selections[column] for column, value in zip(FILTER_COLUMNS, segment)):
+            continue
+        total = n + n_b
+        share = np.divide(n_b, total, out=np.zeros(shape), where=total > 0)
+        delta = mean_b - mean
+        mean = mean + delta * share
+        m2 = m2 + m2_b + delta ** 2 * n * share
+        comoment = comoment + comoment_b + delta * delta.T * n * share
+        n = total
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        corr = np.where(n > 1, comoment / np.sqrt(m2 * m2.T), np.nan)
+    return pd.DataFrame(corr, index=CORR_COLUMNS, columns=CORR_COLUMNS)
 
 # -----------------------------------------------
 # 🟢 Sidebar: Filters + Color Theme
@@ -59,11 +255,10 @@ gender = st.sidebar.multiselect(
 color_theme_list = ['viridis', 'plasma', 'cividis', 'inferno', 'magma', 'blues', 'greens', 'reds', 'turbo', 'rainbow']
 selected_color_theme = st.sidebar.selectbox("Select a Color Theme:", color_theme_list)
 
-df_selection = df.query(
-    "City == @city & Customer_type == @customer_type & Gender == @gender"
-)
+selections = {"City": city, "Customer_type": customer_type, "Gender": gender}
+cube_selection = filter_cube(selections)
 
-if df_selection.empty:
+if cube_selection.empty:
     st.warning("No data available based on the current filter settings!")
     st.stop()
 
@@ -73,10 +268,12 @@ if df_selection.empty:
 st.title(":bar_chart: Sales Dashboard")
 st.markdown("##")
 
-total_sales = int(df_selection["Total"].sum())
-average_rating = round(df_selection["Rating"].mean(), 1)
+transactions = cube_selection["Transactions"].sum()
+total_sales = int(cube_selection["Total"].sum())
+rated = cube_selection["Rating_count"].sum()
+average_rating = round(cube_selection["Rating_sum"].sum() / rated, 1) if rated else 0.0
 star_rating = ":star:" * int(round(average_rating, 0))
-average_sale_by_transaction = round(df_selection["Total"].mean(), 2)
+average_sale_by_transaction = round(cube_selection["Total"].sum() / transactions, 2)
 
 left_column, middle_column, right_column = st.columns(3)
 with left_column:
@@ -92,128 +289,196 @@ with right_column:
 st.markdown("""---""")
 
 # -----------------------------------------------
-# 🟢 Sales by Product Line [Bar Chart]
-# -----------------------------------------------
-sales_by_product_line = df_selection.groupby(by=["Product line"])[["Total"]].sum().sort_values(by="Total").reset_index()
-
-fig_product_sales = px.bar(
-    sales_by_product_line,
-    x="Total",
-    y="Product line",
-    orientation="h",
-    title="<b>Sales by Product Line</b>",
-    color="Total",
-    color_continuous_scale=selected_color_theme,
-    template="plotly_white",
-)
-fig_product_sales.update_layout(
-    plot_bgcolor="rgba(0,0,0,0)",
-    xaxis=dict(showgrid=False)
-)
-
-# -----------------------------------------------
-# 🟢 Sales by Hour [Bar Chart]
-# -----------------------------------------------
-sales_by_hour = df_selection.groupby(by=["hour"])[["Total"]].sum().reset_index()
-
-fig_hourly_sales = px.bar(
-    sales_by_hour,
-    x="hour",
-    y="Total",
-    title="<b>Sales by Hour</b>",
-    color="Total",
-    color_continuous_scale=selected_color_theme,
-    template="plotly_white",
-)
-fig_hourly_sales.update_layout(
-    xaxis=dict(tickmode="linear"),
-    plot_bgcolor="rgba(0,0,0,0)",
-    yaxis=dict(showgrid=False)
-)
-
-left_column, right_column = st.columns(2)
-left_column.plotly_chart(fig_hourly_sales, use_container_width=True)
-right_column.plotly_chart(fig_product_sales, use_container_width=True)
-
-# -----------------------------------------------
-# 🟢 Sunburst Chart
-# -----------------------------------------------
-fig_sunburst = px.sunburst(
-    df_selection,
-    path=['City', 'Customer_type', 'Gender'],
-    values='Total',
-    color='Total',
-    color_continuous_scale=selected_color_theme,
-    title='<b>Sales Distribution - Sunburst</b>',
-    template='plotly_white'
-)
-fig_sunburst.update_layout(
-    margin=dict(t=50, l=25, r=25, b=25)
-)
-
-# -----------------------------------------------
-# 🟢 Treemap Chart
+# 🟢 Figure builders, cached per data mtime + filter selection + color theme
 # -----------------------------------------------
-fig_treemap = px.treemap(
-    df_selection,
-    path=['City', 'Product line'],
-    values='Total',
-    color='Total',
-    color_continuous_scale=selected_color_theme,
-    title='<b>Sales Distribution - Treemap</b>',
-    template='plotly_white'
-)
-fig_treemap.update_layout(
-    margin=dict(t=50, l=25, r=25, b=25)
-)
-
-st.markdown("""---""")
-st.subheader("Sunburst & Treemap")
+FIGURE_CACHE_ENTRIES = 64
+
+def selection_rows(selection_key):
+    return df.iloc[filter_rows(dict(zip(FILTER_COLUMNS, selection_key)))]
+
+def selection_cells(selection_key):
+    return filter_cube(dict(zip(FILTER_COLUMNS, selection_key)))
+
+@st.cache_resource(max_entries=FIGURE_CACHE_ENTRIES)
+def make_product_sales(mtime, selection_key, color_theme):
+    sales_by_product_line = selection_cells(selection_key).groupby(by=["Product line"])[["Total"]].sum().sort_values(by="Total").reset_index()
+
+    fig_product_sales = px.bar(
+        sales_by_product_line,
+        x="Total",
+        y="Product line",
+        orientation="h",
+        title="<b>Sales by Product Line</b>",
+        color="Total",
+        color_continuous_scale=color_theme,
+        template="plotly_white",
+    )
+    fig_product_sales.update_layout(
+        plot_bgcolor="rgba(0,0,0,0)",
+        xaxis=dict(showgrid=False)
+    )
+    return fig_product_sales
+
+@st.cache_resource(max_entries=FIGURE_CACHE_ENTRIES)
+def make_hourly_sales(mtime, selection_key, color_theme):
+    sales_by_hour = selection_cells(selection_key).groupby(by=["hour"])[["Total"]].sum().reset_index()
+
+    fig_hourly_sales = px.bar(
+        sales_by_hour,
+        x="hour",
+        y="Total",
+        title="<b>Sales by Hour</b>",
+        color="Total",
+        color_continuous_scale=color_theme,
+        template="plotly_white",
+    )
+    fig_hourly_sales.update_layout(
+        xaxis=dict(tickmode="linear"),
+        plot_bgcolor="rgba(0,0,0,0)",
+        yaxis=dict(showgrid=False)
+    )
+    return fig_hourly_sales
+
+@st.cache_resource(max_entries=FIGURE_CACHE_ENTRIES)
+def make_sunburst(mtime, selection_key, color_theme):
+    fig_sunburst = px.sunburst(
+        selection_rows(selection_key),
+        path=['City', 'Customer_type', 'Gender'],
+        values='Total',
+        color='Total',
+        color_continuous_scale=color_theme,
+        title='<b>Sales Distribution - Sunburst</b>',
+        template='plotly_white'
+    )
+    fig_sunburst.update_layout(
+        margin=dict(t=50, l=25, r=25, b=25)
+    )
+    return fig_sunburst
+
+@st.cache_resource(max_entries=FIGURE_CACHE_ENTRIES)
+def make_treemap(mtime, selection_key, color_theme):
+    fig_treemap = px.treemap(
+        selection_rows(selection_key),
+        path=['City', 'Product line'],
+        values='Total',
+        color='Total',
+        color_continuous_scale=color_theme,
+        title='<b>Sales Distribution - Treemap</b>',
+        template='plotly_white'
+    )
+    fig_treemap.update_layout(
+        margin=dict(t=50, l=25, r=25, b=25)
+    )
+    return fig_treemap
+
+@st.cache_resource(max_entries=FIGURE_CACHE_ENTRIES)
+def make_heatmap(mtime, selection_key, color_theme):
+    corr_matrix = correlation_from_moments(dict(zip(FILTER_COLUMNS, selection_key)))
+
+    fig_heatmap = px.imshow(
+        corr_matrix,
+        text_auto=True,
+        color_continuous_scale=color_theme,
+        title="<b>Correlation Heatmap</b>",
+        template='plotly_white'
+    )
+    fig_heatmap.update_layout(
+        margin=dict(t=50, l=25, r=25, b=25)
+    )
+    return fig_heatmap
+
+# Above this many transactions the bubble chart stops drawing one SVG marker per row
+BUBBLE_ROW_THRESHOLD = 10_000
+BUBBLE_BINS = 40
+BUBBLE_SAMPLE_SIZE = 5_000
+BUBBLE_MODES = ("Auto", "All points", "Density (2D bins)", "Sample per City")
+
+def bin_bubbles(rows, bins=BUBBLE_BINS):
+    """2D-histogram the rows per City; each bubble sits at its bin's mean and is sized by summed Quantity."""
+    x_bin = pd.cut(rows["Unit price"], bins).rename("x_bin")
+    y_bin = pd.cut(rows["Total"], bins).rename("y_bin")
+    return rows.groupby(by=[rows["City"], x_bin, y_bin], observed=True).agg(
+        **{
+            "Unit price": ("Unit price", "mean"),
+            "Total": ("Total", "mean"),
+            "Quantity": ("Quantity", "sum"),
+            "Transactions": ("Total", "size"),
+        }
+    ).reset_index().drop(columns=["x_bin", "y_bin"])
+
+def sample_per_city(rows, sample_size=BUBBLE_SAMPLE_SIZE):
+    """Proportional stratified sample, so every City keeps its share of the points."""
+    if len(rows) <= sample_size:
+        return rows
+    return rows.groupby(by="City").sample(frac=sample_size / len(rows), random_state=0)
+
+@st.cache_resource(max_entries=FIGURE_CACHE_ENTRIES)
+def make_bubble(mtime, selection_key, color_theme, bubble_mode):
+    rows = selection_rows(selection_key)
+    if bubble_mode == "Auto":
+        bubble_mode = "All points" if len(rows) <= BUBBLE_ROW_THRESHOLD else "Density (2D bins)"
+
+    hover_data = None
+    if bubble_mode == "Density (2D bins)":
+        rows = bin_bubbles(rows)
+        hover_data = ["Transactions"]
+    elif bubble_mode == "Sample per City":
+        rows = sample_per_city(rows)
+
+    fig_bubble = px.scatter(
+        rows,
+        x="Unit price",
+        y="Total",
+        size="Quantity",
+        color="City",
+        hover_data=hover_data,
+        render_mode="webgl" if len(rows) > BUBBLE_ROW_THRESHOLD else "svg",
+        color_discrete_sequence=px.colors.qualitative.Set1,
+        title=f"<b>Bubble Chart - Unit Price vs Total Sales</b> ({bubble_mode.lower()}, {len(rows):,} markers)",
+        template='plotly_white'
+    )
+    fig_bubble.update_layout(
+        margin=dict(t=50, l=25, r=25, b=25)
+    )
+    return fig_bubble
 
-left_column, right_column = st.columns(2)
-left_column.plotly_chart(fig_sunburst, use_container_width=True)
-right_column.plotly_chart(fig_treemap, use_container_width=True)
+def show_figure(container, make_figure, *args):
+    """Build (or fetch) a figure, render it and show how long that took."""
+    start = time.perf_counter()
+    fig = make_figure(data_mtime, selection_key, selected_color_theme, *args)
+    container.plotly_chart(fig, use_container_width=True)
+    container.caption(f"⏱️ {(time.perf_counter() - start) * 1000:.1f} ms")
 
 # -----------------------------------------------
-# 🟢 Heatmap (Correlation)
+# 🟢 Chart sections: only the selected one is built and sent
 # -----------------------------------------------
-corr_matrix = df_selection[["Unit price", "Quantity", "Total", "Rating"]].corr()
-
-fig_heatmap = px.imshow(
-    corr_matrix,
-    text_auto=True,
-    color_continuous_scale=selected_color_theme,
-    title="<b>Correlation Heatmap</b>",
-    template='plotly_white'
-)
-fig_heatmap.update_layout(
-    margin=dict(t=50, l=25, r=25, b=25)
-)
+selection_key = tuple(tuple(sorted(selections[column])) for column in FILTER_COLUMNS)
 
-st.markdown("""---""")
-st.subheader("Correlation Heatmap")
-st.plotly_chart(fig_heatmap, use_container_width=True)
-
-# -----------------------------------------------
-# 🟢 Bubble Chart (Scatter with Size)
-# -----------------------------------------------
-fig_bubble = px.scatter(
-    df_selection,
-    x="Unit price",
-    y="Total",
-    size="Quantity",
-    color="City",
-    color_discrete_sequence=px.colors.qualitative.Set1,
-    title="<b>Bubble Chart - Unit Price vs Total Sales</b>",
-    template='plotly_white'
-)
-fig_bubble.update_layout(
-    margin=dict(t=50, l=25, r=25, b=25)
+chart_section = st.radio(
+    "Select a Chart Section:",
+    ("Sales by Hour & Product Line", "Sunburst & Treemap", "Correlation Heatmap", "Bubble Chart"),
+    horizontal=True,
 )
 
-st.markdown("""---""")
-st.subheader("Bubble Chart")
-st.plotly_chart(fig_bubble, use_container_width=True)
+if chart_section == "Sales by Hour & Product Line":
+    left_column, right_column = st.columns(2)
+    show_figure(left_column, make_hourly_sales)
+    show_figure(right_column, make_product_sales)
+
+elif chart_section == "Sunburst & Treemap":
+    st.subheader("Sunburst & Treemap")
+    left_column, right_column = st.columns(2)
+    show_figure(left_column, make_sunburst)
+    show_figure(right_column, make_treemap)
+
+elif chart_section == "Correlation Heatmap":
+    st.subheader("Correlation Heatmap")
+    show_figure(st, make_heatmap)
+
+elif chart_section == "Bubble Chart":
+    st.subheader("Bubble Chart")
+    bubble_mode = st.radio("Bubble Mode:", BUBBLE_MODES, horizontal=True)
+    show_figure(st, make_bubble, bubble_mode)
 
 # # -----------------------------------------------
 # # 🟢 Geo Map (Scatter Geo)
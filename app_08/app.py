@@ -1,9 +1,46 @@
 # streamlit_app.py
 
+import io
+import os
+import tempfile
+import time
+
 import streamlit as st
 import cv2
 import numpy as np
 from PIL import Image
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from modules.batch import run_batch
+from modules.encoding import FORMATS, encode_image
+from modules.faces import DEFAULT_PROXY_SIZE, PROXY_SIZES
+from modules.memory import ImageStore, SessionImages
+from modules.pipeline import StageCache, pipeline_key, preview_stages, run_pipeline, stage_key, stage_keys
+from modules.superres import DEFAULT_MODEL_PATH, SuperResolutionError, parse_model_name
+from modules.utils import image_fingerprint
+from modules.video import VideoProcessor, read_first_frame
+
+# Memory budget of the stage cache shared by all sessions
+STAGE_CACHE_MB = 512
+# Longest side of the proxy that interactive edits run on
+PREVIEW_SIZE = 1280
+# Decoded images a session may keep in memory, larger ones are spilled to disk
+SESSION_IMAGE_MB = int(os.environ.get("SESSION_IMAGE_MB", 64))
+# The image memory view lists every session: it needs IMAGE_ADMIN=1 on the server and ?admin in the URL
+ADMIN_VIEW = os.environ.get("IMAGE_ADMIN") == "1"
+# (height, width) the annotation sliders span in batch mode, positions past an image's edge are clipped
+BATCH_SHAPE = (1080, 1920)
+
+
+@st.cache_resource
+def get_stage_cache():
+    return StageCache(max_bytes=STAGE_CACHE_MB * 1024 * 1024)
+
+
+@st.cache_resource
+def get_image_store():
+    return ImageStore(budget=SESSION_IMAGE_MB * 1024 * 1024)
+
 
 # -------------------------------
 # Page Config
@@ -25,15 +62,61 @@ st.write(
 # -------------------------------
 # Session State
 # -------------------------------
-if "img" not in st.session_state:
-    st.session_state.img = None
+# Only the key and shape of the image live in session state, its pixels are in the image store
+if "img_key" not in st.session_state:
+    st.session_state.img_key = None
+    st.session_state.img_shape = None
+    st.session_state.images = SessionImages(get_image_store(), get_script_run_ctx().session_id)
+
+
+def load_image(data, decode):
+    """Decode only when the incoming bytes differ from the current image."""
+    key = image_fingerprint(data)
+    if st.session_state.img_key != key:
+        img = decode(data)
+        if st.session_state.img_key is not None:
+            st.session_state.images.discard(st.session_state.img_key)
+        st.session_state.images.put(key, img)
+        st.session_state.img_shape = img.shape
+        st.session_state.img_key = key
+
+
+def get_image():
+    return st.session_state.images.get(st.session_state.img_key)
+
+
+def decode_upload(data):
+    return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), 1)
+
+
+def decode_webcam(data):
+    img = np.array(Image.open(io.BytesIO(data)))
+    return cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
+
+
+def save_video(video_file):
+    """OpenCV reads videos from a path: keep one temp copy per distinct upload."""
+    data = video_file.getvalue()
+    extension = os.path.splitext(video_file.name)[1]
+    path = os.path.join(tempfile.gettempdir(), f"video_{image_fingerprint(data)}{extension}")
+    if not os.path.exists(path):
+        with open(path, "wb") as f:
+            f.write(data)
+    return path
+
+
+def show_image(container, image):
+    if len(image.shape) == 2:
+        container.image(image, channels="GRAY", use_container_width=True)
+    else:
+        container.image(cv2.cvtColor(image, cv2.COLOR_BGR2RGB), channels="RGB", use_container_width=True)
 
 # -------------------------------
 # Input Source
 # -------------------------------
 option = st.sidebar.radio(
     "📷 Input Source",
-    ("Upload Image", "Use Webcam"),
+    ("Upload Image", "Use Webcam", "Live Video", "Batch Images"),
     horizontal=True,
 )
 
@@ -42,9 +125,7 @@ if option == "Upload Image":
         "Choose an image...", type=["jpg", "jpeg", "png"]
     )
     if uploaded_file is not None:
-        file_bytes = np.asarray(bytearray(uploaded_file.read()), dtype=np.uint8)
-        img = cv2.imdecode(file_bytes, 1)
-        st.session_state.img = img
+        load_image(uploaded_file.getvalue(), decode_upload)
     else:
         st.stop()
 
@@ -53,28 +134,68 @@ elif option == "Use Webcam":
     st.info("👉 Your camera preview is below. Use good lighting for better quality!")
     img_file_buffer = st.camera_input("Take a picture")
     if img_file_buffer is not None:
-        img = Image.open(img_file_buffer)
-        img = np.array(img)
-        img = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
-        st.session_state.img = img
+        load_image(img_file_buffer.getvalue(), decode_webcam)
     else:
         st.stop()
 
+elif option == "Live Video":
+    # A recorded video stands in for the camera, e.g. for testing
+    video_source = st.sidebar.radio("🎥 Video Source", ("Camera", "Video File"), horizontal=True)
+    if video_source == "Camera":
+        st.sidebar.caption("The camera is read on the machine running the app.")
+        source = int(st.sidebar.number_input("Camera Index", 0, 9, 0))
+    else:
+        video_file = st.sidebar.file_uploader("Choose a video...", type=["mp4", "avi", "mov", "mkv"])
+        if video_file is None:
+            st.stop()
+        source = save_video(video_file)
+    # The first frame stands in for the image while the stages are configured
+    try:
+        load_image(f"video:{source}".encode(), lambda _: read_first_frame(source))
+    except ValueError as e:
+        st.error(f"⚠️ {e}")
+        st.stop()
+
+elif option == "Batch Images":
+    # Batch runs need no single image: the stages configured below are applied to every upload
+    batch_files = st.sidebar.file_uploader(
+        "Choose images or ZIP archives...",
+        type=["jpg", "jpeg", "png", "zip"],
+        accept_multiple_files=True,
+    )
+
+# A live processor is only kept while its source is selected
+video = st.session_state.get("video")
+if video is not None and (option != "Live Video" or video.source != source or not video.running):
+    video.stop()
+    st.session_state.video = None
+
 # -------------------------------
 # Reset Button
 # -------------------------------
 if st.sidebar.button("🔄 Reset All"):
-    st.session_state.img = None
+    if st.session_state.img_key is not None:
+        st.session_state.images.discard(st.session_state.img_key)
+    if st.session_state.get("render") is not None:
+        st.session_state.images.discard(st.session_state.render["signature"])
+    st.session_state.img_key = None
+    st.session_state.img_shape = None
+    st.session_state.render = None
     st.rerun()
 
 # -------------------------------
 # Work Copy
 # -------------------------------
-if st.session_state.img is None:
+if option == "Batch Images":
+    img_shape = BATCH_SHAPE
+elif st.session_state.img_key is None:
     st.warning("⚠️ No image loaded.")
     st.stop()
+else:
+    img_shape = st.session_state.img_shape
 
-output = st.session_state.img.copy()
+# Ordered (stage name, params) list, run by modules.pipeline
+stages = []
 
 # -------------------------------
 # Filters & Adjustments
@@ -83,26 +204,24 @@ st.sidebar.header("🎨 Filters & Adjustments")
 
 # Grayscale
 if st.sidebar.checkbox("Grayscale"):
-    output = cv2.cvtColor(output, cv2.COLOR_BGR2GRAY)
+    stages.append(("grayscale", {}))
 
 # Blur
 if st.sidebar.checkbox("Blur"):
     k = st.sidebar.slider("Kernel Size", 1, 25, 5, step=2)
-    output = cv2.GaussianBlur(output, (k, k), 0)
+    stages.append(("blur", {"k": k}))
 
 # Canny Edge
 if st.sidebar.checkbox("Canny Edge"):
     t1 = st.sidebar.slider("Threshold 1", 0, 300, 100)
     t2 = st.sidebar.slider("Threshold 2", 0, 300, 200)
-    output = cv2.Canny(output, t1, t2)
+    stages.append(("canny", {"t1": t1, "t2": t2}))
 
 # Brightness & Contrast
 if st.sidebar.checkbox("Adjust Brightness/Contrast"):
     brightness = st.sidebar.slider("Brightness", -100, 100, 0)
     contrast = st.sidebar.slider("Contrast", 0.5, 3.0, 1.0, step=0.1)
-    if len(output.shape) == 2:
-        output = cv2.cvtColor(output, cv2.COLOR_GRAY2BGR)
-    output = cv2.convertScaleAbs(output, alpha=contrast, beta=brightness)
+    stages.append(("brightness_contrast", {"brightness": brightness, "contrast": contrast}))
 
 # -------------------------------
 # Transform Tools
@@ -112,41 +231,32 @@ st.sidebar.header("🔄 Transform")
 # Rotation
 if st.sidebar.checkbox("Rotate"):
     angle = st.sidebar.slider("Angle", -180, 180, 0)
-    (h, w) = output.shape[:2]
-    center = (w // 2, h // 2)
-    M = cv2.getRotationMatrix2D(center, angle, 1.0)
-    output = cv2.warpAffine(output, M, (w, h))
+    stages.append(("rotate", {"angle": angle}))
 
 # Flip
 flip_option = st.sidebar.selectbox("Flip Image", ("None", "Horizontal", "Vertical"))
-if flip_option == "Horizontal":
-    output = cv2.flip(output, 1)
-elif flip_option == "Vertical":
-    output = cv2.flip(output, 0)
+if flip_option != "None":
+    stages.append(("flip", {"direction": flip_option}))
 
 # -------------------------------
 # Draw Tools
 # -------------------------------
 st.sidebar.header("✏️ Annotate")
 
+# Earlier stages never change the image size, so the sliders can use the input's
 if st.sidebar.checkbox("Draw Rectangle"):
-    x = st.sidebar.slider("X", 0, output.shape[1], 50)
-    y = st.sidebar.slider("Y", 0, output.shape[0], 50)
-    w = st.sidebar.slider("Width", 1, output.shape[1], 100)
-    h = st.sidebar.slider("Height", 1, output.shape[0], 100)
-    color = (255, 0, 0)
-    thickness = 2
-    output = cv2.rectangle(output, (x, y), (x + w, y + h), color, thickness)
+    x = st.sidebar.slider("X", 0, img_shape[1], 50)
+    y = st.sidebar.slider("Y", 0, img_shape[0], 50)
+    w = st.sidebar.slider("Width", 1, img_shape[1], 100)
+    h = st.sidebar.slider("Height", 1, img_shape[0], 100)
+    stages.append(("rectangle", {"x": x, "y": y, "w": w, "h": h}))
 
 if st.sidebar.checkbox("Add Text"):
     text = st.sidebar.text_input("Text", "OpenCV Streamlit!")
-    pos_x = st.sidebar.slider("Text X", 0, output.shape[1], 50)
-    pos_y = st.sidebar.slider("Text Y", 0, output.shape[0], 50)
+    pos_x = st.sidebar.slider("Text X", 0, img_shape[1], 50)
+    pos_y = st.sidebar.slider("Text Y", 0, img_shape[0], 50)
     font_scale = st.sidebar.slider("Font Scale", 0.5, 3.0, 1.0)
-    font_color = (0, 0, 255)
-    output = cv2.putText(
-        output, text, (pos_x, pos_y), cv2.FONT_HERSHEY_SIMPLEX, font_scale, font_color, 2
-    )
+    stages.append(("text", {"text": text, "x": pos_x, "y": pos_y, "font_scale": font_scale}))
 
 # -------------------------------
 # Face Detection
@@ -154,61 +264,271 @@ if st.sidebar.checkbox("Add Text"):
 st.sidebar.header("👤 Face Detection")
 
 if st.sidebar.checkbox("Detect Faces"):
-    face_cascade = cv2.CascadeClassifier(
-        cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
+    # Detection runs on a downscaled proxy, boxes are mapped back to full size
+    proxy_size = st.sidebar.select_slider(
+        "Detection Size (px)",
+        options=PROXY_SIZES,
+        value=DEFAULT_PROXY_SIZE,
+        format_func=lambda size: "Full" if size is None else str(size),
     )
-    gray = cv2.cvtColor(output, cv2.COLOR_BGR2GRAY) if len(output.shape) == 3 else output
-    faces = face_cascade.detectMultiScale(gray, 1.1, 4)
-    for (x, y, w, h) in faces:
-        output = cv2.rectangle(output, (x, y), (x + w, y + h), (0, 255, 0), 2)
+    stages.append(("faces", {"proxy_size": proxy_size}))
 
 # -------------------------------
 # AI Super-Resolution SD ➜ HD
 # -------------------------------
 st.sidebar.header("📈 Super-Resolution")
 
-if st.sidebar.checkbox("Convert SD ➜ HD"):
-    try:
-        sr = cv2.dnn_superres.DnnSuperResImpl_create()
-        # You must download EDSR_x4.pb and put it in your project folder
-        sr.readModel("EDSR_x4.pb")
-        sr.setModel("edsr", 4)  # or other scale
-        output = sr.upsample(output)
-        st.success("✅ Image upscaled using AI Super-Resolution (EDSR x4).")
-    except Exception as e:
-        st.error(f"⚠️ Error: {e}")
+super_resolution = st.sidebar.checkbox("Convert SD ➜ HD")
+if super_resolution:
+    # You must download EDSR_x4.pb and put it in your project folder (or set SR_MODEL_PATH)
+    if os.path.exists(DEFAULT_MODEL_PATH):
+        # The mtime keys cached upscales by the model's version, so a replaced model is used at once
+        model_mtime = os.path.getmtime(DEFAULT_MODEL_PATH)
+        stages.append(("superres", {"model_path": DEFAULT_MODEL_PATH, "model_mtime": model_mtime}))
+    else:
+        st.error(f"⚠️ Error: model file {DEFAULT_MODEL_PATH} not found.")
         st.info(
             "👉 Make sure you have EDSR_x4.pb in your project folder.\n"
             "Download from: https://github.com/Saafke/EDSR_Tensorflow"
         )
+        super_resolution = False
+
+# -------------------------------
+# Download Format
+# -------------------------------
+file_format = st.sidebar.selectbox("📥 Download Format", tuple(FORMATS))
+_, mime, _, option_label, (option_min, option_max), option_default = FORMATS[file_format]
+encode_option = st.sidebar.slider(f"{file_format} {option_label}", option_min, option_max, option_default)
+
+# -------------------------------
+# Batch Processing
+# -------------------------------
+if option == "Batch Images":
+    st.subheader("📦 Batch Processing")
+    st.write("Apply the current filters, transforms, annotations & face detection to many images at once.")
+
+    if batch_files and st.button("▶️ Run Batch"):
+        batch_stages = [stage for stage in stages if stage[0] != "superres"]
+        status = st.empty()
+        processed = []
+
+        def on_result(row):
+            processed.append(row)
+            status.write(f"⏳ Processed {len(processed)} images...")
+
+        # Only the last run's ZIP is kept, the finalizer removes it when the session ends
+        if st.session_state.get("batch") is not None:
+            st.session_state.batch.delete()
+            st.session_state.batch = None
+        st.session_state.batch = run_batch(batch_files, batch_stages, file_format, encode_option, on_result)
+        status.empty()
+
+    batch = st.session_state.get("batch")
+    if batch is not None and os.path.exists(batch.path):
+        failures = [row for row in batch.report if row[3] is not None]
+        st.success(f"✅ {len(batch.report) - len(failures)} of {len(batch.report)} images processed.")
+        with open(batch.path, "rb") as zip_file:
+            st.download_button(
+                label="⬇️ Download ZIP",
+                data=zip_file,
+                file_name="processed_images.zip",
+                mime="application/zip",
+            )
+        st.dataframe(
+            [
+                {
+                    "Image": name,
+                    "Time (ms)": None if seconds is None else round(seconds * 1000, 1),
+                    "Size (KB)": None if size is None else round(size / 1024, 1),
+                    "Error": error,
+                }
+                for name, seconds, size, error in batch.report
+            ],
+            use_container_width=True,
+        )
+        for name, _, _, error in failures:
+            st.warning(f"⚠️ {name}: {error}")
+    elif not batch_files:
+        st.info("👉 Choose images or ZIP archives in the sidebar.")
+    st.stop()
+
+# -------------------------------
+# Preview Render
+# -------------------------------
+# Edits are recorded at full resolution but run on a screen-sized proxy;
+# only the stages downstream of a changed parameter are recomputed
+preview_ratio = min(1.0, PREVIEW_SIZE / max(img_shape[:2]))
+
+
+def render(stages, ratio, cache):
+    # Pixels are only fetched (possibly from disk) when a stage is not cached
+    return run_pipeline(get_image, st.session_state.img_key, preview_stages(stages, ratio), cache)
+
+
+try:
+    output, stage_timings = render(stages, preview_ratio, get_stage_cache())
+    if super_resolution:
+        model_name, model_scale = parse_model_name(DEFAULT_MODEL_PATH)
+        st.success(f"✅ Image upscaled using AI Super-Resolution ({model_name.upper()} x{model_scale}).")
+except SuperResolutionError as e:
+    # Only the super-resolution stage is dropped, it is always the last one
+    st.error(f"⚠️ Error: {e}")
+    stages.pop()
+    super_resolution = False
+    output, stage_timings = render(stages, preview_ratio, get_stage_cache())
+
+# Preview time of every stage of the current chain (proxy resize included), by stage key, as measured
+# when this session computed it; stages served from the shared cache stay unmeasured
+preview_keys = stage_keys(st.session_state.img_key, preview_stages(stages, preview_ratio))
+preview_costs = st.session_state.get("preview_costs", {})
+preview_costs.update((key, seconds) for key, (_, seconds, cached) in zip(preview_keys, stage_timings) if not cached)
+st.session_state.preview_costs = {key: preview_costs[key] for key in preview_keys if key in preview_costs}
 
 # -------------------------------
 # Show Result
 # -------------------------------
 st.subheader("📌 Processed Image")
 
-if len(output.shape) == 2:
-    st.image(output, channels="GRAY", use_container_width=True)
-else:
-    output_rgb = cv2.cvtColor(output, cv2.COLOR_BGR2RGB)
-    st.image(output_rgb, channels="RGB", use_container_width=True)
+show_image(st, output)
+
+if preview_ratio < 1:
+    st.caption(
+        f"Preview at {output.shape[1]}×{output.shape[0]} "
+        f"(full image {img_shape[1]}×{img_shape[0]} is rendered on download)"
+    )
+
+if stage_timings:
+    with st.expander("⏱️ Pipeline Timings"):
+        for name, seconds, cached in stage_timings:
+            st.write(f"`{name}`: {seconds * 1000:.1f} ms{' (cached)' if cached else ''}")
 
 # -------------------------------
 # Download
 # -------------------------------
-file_format = st.sidebar.selectbox("📥 Download Format", ("PNG", "JPEG"))
-result_img = output_rgb if len(output.shape) == 3 else output
+# The full-resolution render is replayed from the recorded stages only on request,
+# and its encoding is cached per output, format & option
+output_key = pipeline_key(st.session_state.img_key, stages)
+encode_key = stage_key(output_key, "encode", {"format": file_format, "option": encode_option})
 
-result_pil = Image.fromarray(result_img)
-buffer = cv2.imencode(
-    ".png" if file_format == "PNG" else ".jpg", np.array(result_pil)
-)[1].tobytes()
+if st.sidebar.button("🖨️ Render Full Resolution"):
+    encoded = get_stage_cache().get(encode_key)
+    full_seconds = preview_seconds = encode_seconds = None
+    if encoded is None:
+        start = time.perf_counter()
+        full_output, _ = render(stages, 1.0, None)
+        full_seconds = time.perf_counter() - start
+        # Only compared when the whole preview chain was measured
+        costs = [st.session_state.preview_costs.get(key) for key in preview_keys]
+        if preview_keys and None not in costs:
+            preview_seconds = sum(costs)
 
-st.download_button(
-    label=f"⬇️ Download as {file_format}",
-    data=buffer,
-    file_name=f"processed_image.{file_format.lower()}",
-    mime="image/png" if file_format == "PNG" else "image/jpeg",
-)
+        encoded, encode_seconds = encode_image(full_output, file_format, encode_option)
+        get_stage_cache().put(encode_key, encoded)
+
+    # The download bytes count against the session's image budget, only the last render is kept
+    if st.session_state.get("render") is not None:
+        st.session_state.images.discard(st.session_state.render["signature"])
+    st.session_state.images.put(encode_key, encoded.tobytes())
+    st.session_state.render = {
+        "signature": encode_key,
+        "size": encoded.nbytes,
+        "full_seconds": full_seconds,
+        "preview_seconds": preview_seconds,
+        "encode_seconds": encode_seconds,
+    }
+
+rendered = st.session_state.get("render")
+if rendered is not None and rendered["signature"] == encode_key:
+    st.download_button(
+        label=f"⬇️ Download as {file_format}",
+        data=st.session_state.images.get(encode_key),
+        file_name=f"processed_image.{file_format.lower()}",
+        mime=mime,
+    )
+    if rendered["full_seconds"] is None:
+        st.caption(f"{rendered['size'] / 1024:,.1f} KB · served from cache")
+    else:
+        caption = (
+            f"{rendered['size'] / 1024:,.1f} KB · encoded in {rendered['encode_seconds'] * 1000:.0f} ms · "
+            f"full render {rendered['full_seconds'] * 1000:.0f} ms"
+        )
+        if rendered["preview_seconds"]:
+            caption += (
+                f" vs preview {rendered['preview_seconds'] * 1000:.0f} ms "
+                f"(the full render takes {rendered['full_seconds'] / rendered['preview_seconds']:.1f}× the preview)"
+            )
+        st.caption(caption)
+else:
+    st.info("🖨️ Click **Render Full Resolution** in the sidebar to prepare the download.")
+
+# -------------------------------
+# Admin: Image Memory (IMAGE_ADMIN=1, open the app with ?admin)
+# -------------------------------
+if ADMIN_VIEW and "admin" in st.query_params:
+    with st.expander("🛠️ Image Memory", expanded=True):
+        usage = get_image_store().usage()
+        current_session = st.session_state.images.session_id
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Images in Memory", f"{sum(row[2] for row in usage) / 2**20:,.1f} MB")
+        col2.metric("Spilled to Disk", f"{sum(row[4] for row in usage) / 2**20:,.1f} MB")
+        col3.metric("Stage Cache", f"{get_stage_cache().nbytes / 2**20:,.1f} MB")
+        st.dataframe(
+            [
+                {
+                    "Session": session_id[:8] + (" (this one)" if session_id == current_session else ""),
+                    "Images": images,
+                    "In Memory (MB)": round(memory / 2**20, 1),
+                    "Spilled": spilled,
+                    "On Disk (MB)": round(disk / 2**20, 1),
+                }
+                for session_id, images, memory, spilled, disk in usage
+            ],
+            use_container_width=True,
+        )
+        st.caption(
+            f"Budget {SESSION_IMAGE_MB} MB per session (SESSION_IMAGE_MB) for images & downloads, "
+            f"stage cache {STAGE_CACHE_MB} MB shared by all sessions."
+        )
 
 st.info("✅ Try different filters & AI upscaling for best results!")
+
+# -------------------------------
+# Live Video
+# -------------------------------
+if option == "Live Video":
+    st.subheader("🎥 Live Video")
+    # Frames are processed at full size without the stage cache, super-resolution is too slow for live video
+    live_stages = [stage for stage in stages if stage[0] != "superres"]
+    if st.toggle("▶️ Start Live Processing"):
+        if st.session_state.get("video") is None:
+            # The source may have gone or be held elsewhere (e.g. a camera open in another session)
+            try:
+                st.session_state.video = VideoProcessor(source, live_stages)
+            except ValueError as e:
+                st.error(f"⚠️ {e}")
+                st.stop()
+        video = st.session_state.video
+        video.set_stages(live_stages)
+
+        frame_slot, stats_slot = st.empty(), st.empty()
+        result_id = 0
+        # Runs until a widget changes: the rerun interrupts this loop, the processor keeps running
+        while video.running:
+            result_id, frame = video.wait_result(result_id)
+            if frame is None:
+                continue
+            show_image(frame_slot, frame)
+            fps, frames_read, frames_dropped, latency = video.stats()
+            stats_slot.caption(
+                " · ".join(
+                    [f"{fps:.1f} FPS", f"{frames_dropped} of {frames_read} frames dropped"]
+                    + [f"`{name}` {seconds * 1000:.1f} ms" for name, seconds in latency.items()]
+                )
+            )
+        if video.error is not None:
+            st.error(f"⚠️ Processing failed: {video.error}")
+        else:
+            st.warning("⚠️ The video source stopped.")
+    elif st.session_state.get("video") is not None:
+        st.session_state.video.stop()
+        st.session_state.video = None
@@ -0,0 +1,154 @@
+# modules/batch.py
+
+import importlib.util
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+import weakref
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from contextlib import contextmanager
+
+import cv2
+import numpy as np
+
+from modules.encoding import FORMATS, encode_image
+from modules.pipeline import run_pipeline
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp", ".tif", ".tiff")
+WORKERS = max(1, min(4, (os.cpu_count() or 1) - 1))
+# Seconds the workers of a pool wait for each other to start
+STARTUP_TIMEOUT = 60
+
+_main_lock = threading.Lock()
+
+
+def iter_inputs(files):
+    """
+    Yields (name, bytes) for every uploaded image, expanding ZIP archives member by member.
+    """
+    for file in files:
+        if file.name.lower().endswith(".zip"):
+            with zipfile.ZipFile(file) as archive:
+                for member in archive.infolist():
+                    if not member.is_dir() and member.filename.lower().endswith(IMAGE_EXTENSIONS):
+                        yield member.filename, archive.read(member)
+        else:
+            yield file.name, file.getvalue()
+
+
+def process_image(data, stages, file_format, option):
+    """
+    Decode, run the stages and encode one image. Runs in a worker process.
+    """
+    start = time.perf_counter()
+    image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError("not a readable image")
+    output, _ = run_pipeline(image, None, stages)
+    encoded, _ = encode_image(output, file_format, option)
+    return encoded.tobytes(), time.perf_counter() - start
+
+
+def output_name(name, extension):
+    return os.path.splitext(name)[0] + extension
+
+
+class BatchArchive:
+    """
+    The ZIP and report of a batch run. Kept in session state, so the file is
+    deleted when the session ends and the archive is garbage collected.
+    """
+
+    def __init__(self, path, report):
+        self.path = path
+        self.report = report
+        self._finalizer = weakref.finalize(self, _remove, path)
+
+    def delete(self):
+        self._finalizer()
+
+
+def _remove(path):
+    if os.path.exists(path):
+        os.remove(path)
+
+
+@contextmanager
+def _spawn_main():
+    """
+    Spawned workers re-run the parent's __main__, which under Streamlit is the app script.
+    While they start, __main__ names this module instead, so they only import what they need.
+    """
+    with _main_lock:
+        main = sys.modules["__main__"]
+        spec = getattr(main, "__spec__", None)
+        main.__spec__ = importlib.util.find_spec(__name__)
+        try:
+            yield
+        finally:
+            main.__spec__ = spec
+
+
+def _worker_started(barrier):
+    # No worker takes a task before all have started, so every warm-up task starts a worker of its own
+    barrier.wait(STARTUP_TIMEOUT)
+
+
+def run_batch(files, stages, file_format, option, on_result=None, workers=WORKERS):
+    """
+    Processes the images on a process pool and streams the results into a ZIP on disk.
+    At most two images per worker are in flight, so memory does not grow with the batch.
+    Returns a BatchArchive holding the ZIP path and a report of (name, seconds, output bytes, error) rows.
+    """
+    extension = FORMATS[file_format][0]
+    report, names = [], set()
+    archive_file = tempfile.NamedTemporaryFile(prefix="batch_", suffix=".zip", delete=False)
+    archive_file.close()
+
+    def collect(future, name):
+        try:
+            encoded, seconds = future.result()
+        except Exception as e:
+            row = (name, None, None, str(e) or type(e).__name__)
+        else:
+            # Encoded images are already compressed, store them as they are
+            archive_name, n = output_name(name, extension), 1
+            while archive_name in names:
+                n += 1
+                archive_name = output_name(f"{os.path.splitext(name)[0]}_{n}", extension)
+            names.add(archive_name)
+            archive.writestr(archive_name, encoded, compress_type=zipfile.ZIP_STORED)
+            row = (name, seconds, len(encoded), None)
+        report.append(row)
+        if on_result is not None:
+            on_result(row)
+
+    # Spawned workers do not inherit the server's threads and locks, which a fork could leave held
+    context = multiprocessing.get_context("spawn")
+    pool = ProcessPoolExecutor(
+        max_workers=workers, mp_context=context, initializer=_worker_started, initargs=(context.Barrier(workers),)
+    )
+    try:
+        # The pool starts a worker per task until it is full: start them all while __main__ is swapped
+        with _spawn_main():
+            for _ in range(workers):
+                pool.submit(os.getpid)
+        with zipfile.ZipFile(archive_file.name, "w") as archive, pool:
+            pending = {}
+            for name, data in iter_inputs(files):
+                pending[pool.submit(process_image, data, stages, file_format, option)] = name
+                if len(pending) >= 2 * workers:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        collect(future, pending.pop(future))
+            for future in wait(pending).done:
+                collect(future, pending[future])
+    except BaseException:
+        _remove(archive_file.name)
+        raise
+
+    return BatchArchive(archive_file.name, report)
@@ -0,0 +1,24 @@
+# modules/encoding.py
+
+import time
+
+import cv2
+
+# Download format -> (extension, mime type, OpenCV option flag, option label, range, default)
+FORMATS = {
+    "PNG": (".png", "image/png", cv2.IMWRITE_PNG_COMPRESSION, "Compression Level", (0, 9), 3),
+    "JPEG": (".jpg", "image/jpeg", cv2.IMWRITE_JPEG_QUALITY, "Quality", (1, 100), 95),
+    "WEBP": (".webp", "image/webp", cv2.IMWRITE_WEBP_QUALITY, "Quality", (1, 100), 90),
+}
+
+
+def encode_image(image, file_format, option):
+    """
+    Encodes a BGR (or grayscale) image; returns the bytes and the encode time in seconds.
+    """
+    extension, _, flag, _, _, _ = FORMATS[file_format]
+    start = time.perf_counter()
+    ok, encoded = cv2.imencode(extension, image, [flag, int(option)])
+    if not ok:
+        raise ValueError(f"could not encode as {file_format}")
+    return encoded, time.perf_counter() - start
@@ -0,0 +1,117 @@
+# modules/faces.py
+
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from modules.utils import image_fingerprint
+
+CASCADE_PATH = cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
+PROXY_SIZES = (320, 480, 640, 960, 1280, None)
+DEFAULT_PROXY_SIZE = 640
+DETECTION_CACHE_ENTRIES = 256
+
+_cascade = None
+_cascade_lock = threading.Lock()
+_detections = OrderedDict()
+_detections_lock = threading.Lock()
+
+
+def get_face_cascade():
+    """
+    The Haar cascade is parsed once per process.
+    """
+    global _cascade
+    with _cascade_lock:
+        if _cascade is None:
+            _cascade = cv2.CascadeClassifier(CASCADE_PATH)
+        return _cascade
+
+
+def make_proxy(gray, proxy_size):
+    """
+    Downscale so the longest side is at most proxy_size; returns the proxy and the scale back to full size.
+    """
+    longest = max(gray.shape[:2])
+    if proxy_size is None or longest <= proxy_size:
+        return gray, 1.0
+    ratio = proxy_size / longest
+    proxy = cv2.resize(gray, None, fx=ratio, fy=ratio, interpolation=cv2.INTER_AREA)
+    return proxy, longest / max(proxy.shape[:2])
+
+
+def find_faces(image, proxy_size=DEFAULT_PROXY_SIZE, scale_factor=1.1, min_neighbors=4):
+    """
+    Returns (x, y, w, h) face boxes in full-resolution coordinates.
+    Detection runs on a downscaled proxy and is cached per proxy content and parameters.
+    """
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if len(image.shape) == 3 else image
+    proxy, back = make_proxy(gray, proxy_size)
+
+    key = (image_fingerprint(proxy), back, scale_factor, min_neighbors)
+    with _detections_lock:
+        if key in _detections:
+            _detections.move_to_end(key)
+            return _detections[key]
+
+    # CascadeClassifier is not thread-safe, sessions take turns on the shared one
+    cascade = get_face_cascade()
+    with _cascade_lock:
+        faces = cascade.detectMultiScale(proxy, scale_factor, min_neighbors)
+    faces = np.round(np.asarray(faces, dtype=float).reshape(-1, 4) * back).astype(int)
+
+    with _detections_lock:
+        _detections[key] = faces
+        while len(_detections) > DETECTION_CACHE_ENTRIES:
+            _detections.popitem(last=False)
+    return faces
+
+
+def iou(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    w = min(ax + aw, bx + bw) - max(ax, bx)
+    h = min(ay + ah, by + bh) - max(ay, by)
+    if w <= 0 or h <= 0:
+        return 0.0
+    inter = w * h
+    return inter / (aw * ah + bw * bh - inter)
+
+
+def benchmark(images, proxy_sizes=PROXY_SIZES, iou_threshold=0.5):
+    """
+    Speed and recall of each proxy size, taking full-resolution detections as ground truth.
+    """
+    cascade = get_face_cascade()
+    truth = []
+    for image in images:
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if len(image.shape) == 3 else image
+        truth.append(np.asarray(cascade.detectMultiScale(gray, 1.1, 4)).reshape(-1, 4))
+
+    results = []
+    for proxy_size in proxy_sizes:
+        seconds, found, total, detected = 0.0, 0, 0, 0
+        for image, expected in zip(images, truth):
+            with _detections_lock:
+                _detections.clear()
+            start = time.perf_counter()
+            faces = find_faces(image, proxy_size)
+            seconds += time.perf_counter() - start
+            total += len(expected)
+            detected += len(faces)
+            found += sum(any(iou(e, f) >= iou_threshold for f in faces) for e in expected)
+        recall = found / total if total else float("nan")
+        results.append((proxy_size or "full", seconds / len(images), recall, detected))
+    return results
+
+
+if __name__ == "__main__":
+    # Benchmark: python -m modules.faces photo1.jpg photo2.jpg ...
+    images = [cv2.imread(path) for path in sys.argv[1:]]
+    print(f"{'proxy':>6} {'ms/image':>10} {'recall':>8} {'faces':>6}")
+    for proxy_size, seconds, recall, detected in benchmark(images):
+        print(f"{proxy_size:>6} {seconds * 1000:>10.1f} {recall:>8.2f} {detected:>6}")
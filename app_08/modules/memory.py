@@ -0,0 +1,175 @@
+# modules/memory.py
+
+import os
+import tempfile
+import threading
+import weakref
+from collections import OrderedDict
+
+import cv2
+
+# PNG is lossless and level 1 keeps spilling fast
+SPILL_FLAGS = [cv2.IMWRITE_PNG_COMPRESSION, 1]
+
+
+class _Entry:
+    __slots__ = ("image", "nbytes", "encoded", "path", "disk_bytes")
+
+    def __init__(self, image):
+        self.image = image
+        # Encoded images (bytes) are spilled as they are, decoded ones as PNG
+        self.encoded = isinstance(image, bytes)
+        self.nbytes = len(image) if self.encoded else image.nbytes
+        self.path = None
+        self.disk_bytes = 0
+
+
+class ImageStore:
+    """
+    Process-wide store of the decoded images sessions work on, and of their encoded downloads.
+    Each session keeps its images in memory up to budget bytes; beyond that the
+    least recently used are spilled to compressed files and reloaded on access.
+    """
+
+    def __init__(self, budget, directory=None):
+        self.budget = budget
+        self.directory = directory or tempfile.mkdtemp(prefix="images_")
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def _admit(self, images, key):
+        """
+        Marks key as most recently used and returns the in-memory entries to spill.
+        """
+        images.move_to_end(key)
+        in_memory = [entry for entry in images.values() if entry.image is not None]
+        # An image over the budget on its own never stays, the others go least recently used first
+        victims = [entry for entry in in_memory if entry.nbytes > self.budget]
+        in_memory = [entry for entry in in_memory if entry.nbytes <= self.budget]
+        nbytes = sum(entry.nbytes for entry in in_memory)
+        for entry in in_memory:
+            if nbytes <= self.budget:
+                break
+            victims.append(entry)
+            nbytes -= entry.nbytes
+        return victims
+
+    def _spill(self, session_id, key, victims):
+        for entry in victims:
+            # Images never change, a file written earlier is still valid
+            if entry.path is None:
+                if entry.encoded:
+                    path, data = os.path.join(self.directory, f"{session_id}_{key}_{id(entry)}.bin"), entry.image
+                else:
+                    path = os.path.join(self.directory, f"{session_id}_{key}_{id(entry)}.png")
+                    ok, data = cv2.imencode(".png", entry.image, SPILL_FLAGS)
+                    if not ok:
+                        continue
+                with open(path, "wb") as f:
+                    f.write(data)
+                entry.path, entry.disk_bytes = path, len(data)
+            entry.image = None
+
+    def put(self, session_id, key, image):
+        """
+        Stores a decoded image (ndarray) or an encoded one (bytes).
+        """
+        if not isinstance(image, bytes):
+            image.flags.writeable = False
+        with self._lock:
+            images = self._sessions.setdefault(session_id, OrderedDict())
+            images[key] = _Entry(image)
+            victims = self._admit(images, key)
+        self._spill(session_id, key, victims)
+
+    def get(self, session_id, key):
+        """
+        Returns the image, reading it back from disk if it was spilled.
+        A spilled image that fits the budget is kept in memory again.
+        Raises KeyError when the image is not (or no longer) in the store.
+        """
+        with self._lock:
+            entry = self._sessions[session_id][key]
+            image = entry.image
+        if image is not None:
+            return image
+
+        image = self._read(entry)
+        if image is None:
+            # The file is gone when the image was discarded or released meanwhile
+            with self._lock:
+                if self._sessions.get(session_id, {}).get(key) is not entry:
+                    raise KeyError(key)
+            raise OSError(f"Could not read the spilled image {entry.path}")
+        if entry.nbytes <= self.budget:
+            with self._lock:
+                images = self._sessions.get(session_id)
+                if images is None or images.get(key) is not entry:
+                    return image
+                entry.image = image
+                victims = self._admit(images, key)
+            self._spill(session_id, key, [victim for victim in victims if victim is not entry])
+        return image
+
+    @staticmethod
+    def _read(entry):
+        if not entry.encoded:
+            image = cv2.imread(entry.path, cv2.IMREAD_UNCHANGED)
+            if image is not None:
+                image.flags.writeable = False
+            return image
+        try:
+            with open(entry.path, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def discard(self, session_id, key):
+        with self._lock:
+            entry = self._sessions.get(session_id, {}).pop(key, None)
+        if entry is not None and entry.path is not None:
+            os.remove(entry.path)
+
+    def release(self, session_id):
+        with self._lock:
+            images = self._sessions.pop(session_id, {})
+        for entry in images.values():
+            if entry.path is not None:
+                os.remove(entry.path)
+
+    def usage(self):
+        """
+        Returns (session id, images, bytes in memory, images spilled, bytes on disk) per session.
+        """
+        with self._lock:
+            return [
+                (
+                    session_id,
+                    len(images),
+                    sum(entry.nbytes for entry in images.values() if entry.image is not None),
+                    sum(entry.image is None for entry in images.values()),
+                    sum(entry.disk_bytes for entry in images.values() if entry.image is None),
+                )
+                for session_id, images in self._sessions.items()
+            ]
+
+
+class SessionImages:
+    """
+    A session's view of the store. Kept in session state, so its images are
+    released when the session ends and the handle is garbage collected.
+    """
+
+    def __init__(self, store, session_id):
+        self.store = store
+        self.session_id = session_id
+        weakref.finalize(self, store.release, session_id)
+
+    def put(self, key, image):
+        self.store.put(self.session_id, key, image)
+
+    def get(self, key):
+        return self.store.get(self.session_id, key)
+
+    def discard(self, key):
+        self.store.discard(self.session_id, key)
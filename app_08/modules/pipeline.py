@@ -0,0 +1,209 @@
+# modules/pipeline.py
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+
+from modules.faces import DEFAULT_PROXY_SIZE, find_faces
+from modules.superres import super_resolve
+
+
+# -------------------------------
+# Stage operations
+# -------------------------------
+def resize(image, ratio):
+    return cv2.resize(image, None, fx=ratio, fy=ratio, interpolation=cv2.INTER_AREA)
+
+
+def grayscale(image):
+    return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if len(image.shape) == 3 else image
+
+
+def blur(image, k):
+    return cv2.GaussianBlur(image, (k, k), 0)
+
+
+def canny(image, t1, t2):
+    return cv2.Canny(image, t1, t2)
+
+
+def brightness_contrast(image, brightness, contrast):
+    if len(image.shape) == 2:
+        image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+    return cv2.convertScaleAbs(image, alpha=contrast, beta=brightness)
+
+
+def rotate(image, angle):
+    (h, w) = image.shape[:2]
+    center = (w // 2, h // 2)
+    M = cv2.getRotationMatrix2D(center, angle, 1.0)
+    return cv2.warpAffine(image, M, (w, h))
+
+
+def flip(image, direction):
+    return cv2.flip(image, 1 if direction == "Horizontal" else 0)
+
+
+def draw_rectangle(image, x, y, w, h, thickness=2):
+    # Drawing is in-place in OpenCV, never touch the (cached) input
+    return cv2.rectangle(image.copy(), (x, y), (x + w, y + h), (255, 0, 0), thickness)
+
+
+def add_text(image, text, x, y, font_scale, thickness=2):
+    return cv2.putText(
+        image.copy(), text, (x, y), cv2.FONT_HERSHEY_SIMPLEX, font_scale, (0, 0, 255), thickness
+    )
+
+
+def detect_faces(image, proxy_size=DEFAULT_PROXY_SIZE, thickness=2):
+    faces = find_faces(image, proxy_size)
+    output = image.copy()
+    for (x, y, w, h) in faces:
+        output = cv2.rectangle(output, (x, y), (x + w, y + h), (0, 255, 0), thickness)
+    return output
+
+
+STAGES = {
+    "resize": resize,
+    "grayscale": grayscale,
+    "blur": blur,
+    "canny": canny,
+    "brightness_contrast": brightness_contrast,
+    "rotate": rotate,
+    "flip": flip,
+    "rectangle": draw_rectangle,
+    "text": add_text,
+    "faces": detect_faces,
+    "superres": super_resolve,
+}
+
+
+def scale_params(name, params, ratio):
+    """
+    Adapts parameters recorded at full resolution to an image `ratio` times the size.
+    """
+    if ratio == 1:
+        return params
+    params = dict(params)
+    thickness = max(1, round(2 * ratio))
+    if name == "blur":
+        params["k"] = max(1, round(params["k"] * ratio)) | 1
+    elif name == "rectangle":
+        params.update({key: max(1, round(params[key] * ratio)) for key in ("w", "h")})
+        params.update({key: round(params[key] * ratio) for key in ("x", "y")})
+        params["thickness"] = thickness
+    elif name == "text":
+        params.update({key: round(params[key] * ratio) for key in ("x", "y")})
+        params["font_scale"] = params["font_scale"] * ratio
+        params["thickness"] = thickness
+    elif name == "faces":
+        params["thickness"] = thickness
+    return params
+
+
+def preview_stages(stages, ratio):
+    """
+    The same edits, replayed on a proxy downscaled by ratio.
+    """
+    if ratio == 1:
+        return list(stages)
+    return [("resize", {"ratio": ratio})] + [(name, scale_params(name, params, ratio)) for name, params in stages]
+
+
+# -------------------------------
+# Stage cache
+# -------------------------------
+def stage_key(input_key, name, params):
+    """
+    Key of a stage output: the key of its input plus the stage name and parameters.
+    """
+    return hashlib.blake2b(
+        f"{input_key}|{name}|{sorted(params.items())!r}".encode(), digest_size=16
+    ).hexdigest()
+
+
+def pipeline_key(image_key, stages):
+    """
+    Key of the final output of stages run on the image with image_key.
+    """
+    key = image_key
+    for name, params in stages:
+        key = stage_key(key, name, params)
+    return key
+
+
+def stage_keys(image_key, stages):
+    """
+    Keys of the output of every stage of stages run on the image with image_key.
+    """
+    keys, key = [], image_key
+    for name, params in stages:
+        key = stage_key(key, name, params)
+        keys.append(key)
+    return keys
+
+
+class StageCache:
+    """
+    Thread-safe LRU of stage outputs, bounded by the total bytes it holds.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        if value.nbytes > self.max_bytes:
+            return
+        # Cached arrays are shared between reruns and sessions: make them read-only
+        value.flags.writeable = False
+        with self._lock:
+            if key in self._items:
+                return
+            self._items[key] = value
+            self.nbytes += value.nbytes
+            while self.nbytes > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+
+    def __len__(self):
+        return len(self._items)
+
+
+def run_pipeline(image, image_key, stages, cache=None):
+    """
+    Runs the ordered (name, params) stages on image.
+    Every stage output is cached by its input key and parameters, so only the
+    stages downstream of a changed parameter are recomputed.
+    image may also be a function returning it, only called when a stage has to run on it.
+    Returns the output and a list of (stage name, seconds, cached) timings.
+    """
+    output, key, timings = image, image_key, []
+    for name, params in stages:
+        key = stage_key(key, name, params)
+        start = time.perf_counter()
+        cached = cache.get(key) if cache is not None else None
+        if cached is None:
+            if callable(output):
+                output = output()
+            output = STAGES[name](output, **params)
+            if cache is not None:
+                cache.put(key, output)
+        else:
+            output = cached
+        timings.append((name, time.perf_counter() - start, cached is not None))
+    if callable(output):
+        output = output()
+    return output, timings
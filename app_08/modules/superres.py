@@ -0,0 +1,144 @@
+# modules/superres.py
+
+import os
+import queue
+import re
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import cv2
+import numpy as np
+
+# Any dnn_superres model named like EDSR_x4.pb / FSRCNN_x2.pb works, e.g. a tiny FSRCNN for tests
+DEFAULT_MODEL_PATH = os.environ.get("SR_MODEL_PATH", "EDSR_x4.pb")
+TILE_SIZE = 256
+TILE_OVERLAP = 16
+WORKERS = min(4, os.cpu_count() or 1)
+
+
+class SuperResolutionError(RuntimeError):
+    """
+    The model could not be loaded or run.
+    """
+
+
+def parse_model_name(model_path):
+    """
+    'EDSR_x4.pb' -> ('edsr', 4)
+    """
+    match = re.match(r"([A-Za-z]+)_x(\d+)", os.path.basename(model_path))
+    if match is None:
+        raise ValueError(f"Cannot tell model and scale from {model_path!r}, expected e.g. EDSR_x4.pb")
+    return match.group(1).lower(), int(match.group(2))
+
+
+def load_model(model_path):
+    name, scale = parse_model_name(model_path)
+    sr = cv2.dnn_superres.DnnSuperResImpl_create()
+    sr.readModel(model_path)
+    sr.setModel(name, scale)
+    return sr
+
+
+class TiledUpscaler:
+    """
+    Upscales images tile by tile on a thread pool.
+    Each worker owns its own model instance (dnn nets are not thread-safe) and at
+    most two tiles per worker are in flight, so memory stays bounded by the output.
+    """
+
+    def __init__(self, models, scale):
+        self.scale = scale
+        self.workers = len(models)
+        self._models = queue.Queue()
+        for model in models:
+            self._models.put(model)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="superres")
+
+    def _upsample_tile(self, tile):
+        model = self._models.get()
+        try:
+            return model.upsample(np.ascontiguousarray(tile))
+        finally:
+            self._models.put(model)
+
+    def _place(self, output, upscaled, box):
+        # Drop the overlap margin and write the tile's own area into the output
+        y0, x0, y1, x1, py0, px0 = box
+        s = self.scale
+        oy, ox = (y0 - py0) * s, (x0 - px0) * s
+        output[y0 * s:y1 * s, x0 * s:x1 * s] = upscaled[oy:oy + (y1 - y0) * s, ox:ox + (x1 - x0) * s]
+
+    def upsample(self, image, tile_size=TILE_SIZE, overlap=TILE_OVERLAP):
+        if len(image.shape) == 2:
+            image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+        h, w = image.shape[:2]
+        output = np.empty((h * self.scale, w * self.scale, image.shape[2]), dtype=image.dtype)
+
+        pending = {}
+        for y0 in range(0, h, tile_size):
+            for x0 in range(0, w, tile_size):
+                y1, x1 = min(y0 + tile_size, h), min(x0 + tile_size, w)
+                py0, px0 = max(y0 - overlap, 0), max(x0 - overlap, 0)
+                py1, px1 = min(y1 + overlap, h), min(x1 + overlap, w)
+                future = self._executor.submit(self._upsample_tile, image[py0:py1, px0:px1])
+                pending[future] = (y0, x0, y1, x1, py0, px0)
+
+                if len(pending) >= 2 * self.workers:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        self._place(output, future.result(), pending.pop(future))
+
+        for future in wait(pending).done:
+            self._place(output, future.result(), pending[future])
+        return output
+
+
+_upscalers = {}
+_upscalers_lock = threading.Lock()
+
+
+def get_upscaler(model_path, workers=WORKERS):
+    """
+    One TiledUpscaler per model file and process, built on first use.
+    """
+    key = (os.path.abspath(model_path), os.path.getmtime(model_path), workers)
+    with _upscalers_lock:
+        if key not in _upscalers:
+            _, scale = parse_model_name(model_path)
+            _upscalers[key] = TiledUpscaler([load_model(model_path) for _ in range(workers)], scale)
+        return _upscalers[key]
+
+
+def super_resolve(image, model_path, tile_size=TILE_SIZE, overlap=TILE_OVERLAP, model_mtime=None):
+    """
+    Upscales image with the model at model_path, raising SuperResolutionError when the model fails.
+    model_mtime is unused here: as a stage parameter it keys cached outputs by the model file's version.
+    """
+    try:
+        upscaler = get_upscaler(model_path)
+    except (cv2.error, OSError, ValueError) as e:
+        raise SuperResolutionError(f"Could not load the model {model_path}: {e}") from e
+    try:
+        return upscaler.upsample(image, tile_size, overlap)
+    except cv2.error as e:
+        raise SuperResolutionError(f"The model {model_path} failed: {e}") from e
+
+
+if __name__ == "__main__":
+    # Smoke test: python -m modules.superres FSRCNN_x2.pb image.jpg
+    model_path, image_path = sys.argv[1], sys.argv[2]
+    image = cv2.imread(image_path)
+
+    start = time.perf_counter()
+    whole = load_model(model_path).upsample(image)
+    print(f"single call: {time.perf_counter() - start:.2f}s")
+
+    start = time.perf_counter()
+    tiled = super_resolve(image, model_path)
+    print(f"tiled x{WORKERS}: {time.perf_counter() - start:.2f}s")
+
+    diff = np.abs(whole.astype(np.int16) - tiled.astype(np.int16))
+    print(f"shape {tiled.shape}, max abs diff {diff.max()}, mean abs diff {diff.mean():.3f}")
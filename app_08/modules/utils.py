@@ -0,0 +1,17 @@
+# modules/utils.py
+
+import hashlib
+
+import numpy as np
+
+
+def image_fingerprint(data):
+    """
+    Short content hash of an encoded upload (bytes) or a decoded image (ndarray).
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    if isinstance(data, np.ndarray):
+        digest.update(f"{data.shape}{data.dtype}".encode())
+        data = np.ascontiguousarray(data)
+    digest.update(memoryview(data))
+    return digest.hexdigest()
@@ -0,0 +1,156 @@
+# modules/video.py
+
+import threading
+import time
+from collections import deque
+
+import cv2
+
+from modules.pipeline import run_pipeline
+
+FPS_WINDOW = 30
+LATENCY_SMOOTHING = 0.2
+# Stop reading when nobody has asked for a frame in this long (e.g. the browser tab was closed)
+IDLE_TIMEOUT = 5.0
+
+
+def read_first_frame(source):
+    capture = cv2.VideoCapture(source)
+    try:
+        ok, frame = capture.read()
+    finally:
+        capture.release()
+    if not ok:
+        raise ValueError(f"Could not read a frame from {source!r}")
+    return frame
+
+
+class VideoProcessor:
+    """
+    Runs the stage pipeline on live frames.
+    A reader thread keeps only the newest frame and a worker thread processes it,
+    so frames that arrive while the worker is busy are dropped instead of queued.
+    Video files are paced at their own frame rate and loop, so they can stand in
+    for a camera.
+    """
+
+    def __init__(self, source, stages):
+        self.source = source
+        self.stages = stages
+        self.capture = cv2.VideoCapture(source)
+        if not self.capture.isOpened():
+            raise ValueError(f"Could not open video source {source!r}")
+        self.is_file = isinstance(source, str)
+        self.frame_interval = 1 / (self.capture.get(cv2.CAP_PROP_FPS) or 30) if self.is_file else 0
+
+        self.frames_read = 0
+        self.frames_dropped = 0
+        # The exception that stopped the worker, if any
+        self.error = None
+        self._stage_latency = {}
+        self._polled_at = time.perf_counter()
+        self._frame = None
+        self._result = None
+        self._result_id = 0
+        self._processed_at = deque(maxlen=FPS_WINDOW)
+        self._condition = threading.Condition()
+        self._running = True
+        self._threads = [
+            threading.Thread(target=self._read_loop, name="video-reader", daemon=True),
+            threading.Thread(target=self._process_loop, name="video-worker", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def _read_loop(self):
+        next_frame_at = time.perf_counter()
+        while self._running and time.perf_counter() - self._polled_at < IDLE_TIMEOUT:
+            ok, frame = self.capture.read()
+            if not ok:
+                if self.is_file:
+                    self.capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                    continue
+                break
+            with self._condition:
+                if self._frame is not None:
+                    self.frames_dropped += 1
+                self._frame = frame
+                self.frames_read += 1
+                self._condition.notify_all()
+            if self.frame_interval:
+                next_frame_at += self.frame_interval
+                time.sleep(max(0.0, next_frame_at - time.perf_counter()))
+        self._running = False
+        with self._condition:
+            self._condition.notify_all()
+
+    def _process_loop(self):
+        while True:
+            with self._condition:
+                while self._running and self._frame is None:
+                    self._condition.wait()
+                if not self._running:
+                    return
+                frame, self._frame = self._frame, None
+
+            stages = self.stages
+            try:
+                output, timings = run_pipeline(frame, None, stages)
+            except Exception as e:
+                # A failing stage would fail on every frame: stop and let the app report it
+                with self._condition:
+                    self.error = e
+                    self._running = False
+                    self._condition.notify_all()
+                return
+
+            with self._condition:
+                if stages is self.stages:
+                    for name, seconds, _ in timings:
+                        previous = self._stage_latency.get(name, seconds)
+                        self._stage_latency[name] = previous + LATENCY_SMOOTHING * (seconds - previous)
+                self._result = output
+                self._result_id += 1
+                self._processed_at.append(time.perf_counter())
+                self._condition.notify_all()
+
+    @property
+    def running(self):
+        return self._running
+
+    def set_stages(self, stages):
+        """
+        Frames processed from now on use the new stages; latencies restart when they change.
+        """
+        with self._condition:
+            if stages != self.stages:
+                self.stages = stages
+                self._stage_latency = {}
+
+    def stats(self):
+        """
+        Returns the processed frames per second, frames read, frames dropped and
+        the smoothed latency of every stage in seconds.
+        """
+        with self._condition:
+            processed = len(self._processed_at)
+            span = self._processed_at[-1] - self._processed_at[0] if processed > 1 else 0
+            fps = (processed - 1) / span if span else 0.0
+            return fps, self.frames_read, self.frames_dropped, dict(self._stage_latency)
+
+    def wait_result(self, last_id, timeout=1.0):
+        """
+        Blocks until a result newer than last_id is ready; returns (result id, frame or None).
+        """
+        with self._condition:
+            self._polled_at = time.perf_counter()
+            self._condition.wait_for(lambda: self._result_id != last_id or not self._running, timeout)
+            return self._result_id, self._result
+
+    def stop(self):
+        self._running = False
+        with self._condition:
+            self._condition.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=2)
+        self.capture.release()
@@ -1,12 +1,21 @@
 # app.py
 
 import streamlit as st
-import pandas as pd
 
-from modules.opportunity import detect_opportunities
-from modules.forecast import run_forecast
-from modules.generator import generate_action_plan
-from modules.utils import plot_forecast
+from modules.loader import content_hash, load_superstore
+from modules.opportunity import detect_opportunities, format_opportunities
+from modules.forecast import run_forecast, run_hierarchical_forecast
+from modules.generator import stream_action_plan
+from modules.utils import plot_forecast, plot_hierarchy
+
+DATA_PATH = "data/Sample_Superstore.xlsx"
+
+
+@st.cache_resource(max_entries=4)
+def load_data(key, _data):
+    """One typed, read-only frame per distinct file, shared by all sessions."""
+    return load_superstore(_data, key)
+
 
 st.set_page_config(page_title="📈 Superstore Opportunity Scanner", layout="wide")
 
@@ -15,14 +24,14 @@ st.title("🚀 Dynamic Business Opportunity Scanner & Action Planner")
 # Upload or use default
 uploaded_file = st.file_uploader("📂 Upload your business data (.xlsx)", type=["xlsx"])
 if uploaded_file is not None:
-    df = pd.read_excel(uploaded_file)
+    data = uploaded_file.getvalue()
     st.success("✅ Data uploaded successfully!")
 else:
-    df = pd.read_excel("data/Sample_Superstore.xlsx")
+    with open(DATA_PATH, "rb") as f:
+        data = f.read()
     st.info("📄 Using built-in Superstore dataset.")
 
-# Drop unwanted columns if they exist
-df = df.drop(columns=[col for col in df.columns if col.strip() in ["A`"]], errors='ignore')
+df = load_data(content_hash(data), data)
 
 st.write("🔍 Preview:", df.head())
 
@@ -30,23 +39,55 @@ st.write("🔍 Preview:", df.head())
 if st.button("🔍 Scan for Opportunities"):
     opportunities = detect_opportunities(df)
     st.subheader("📈 Potential Opportunities")
-    st.write(opportunities)
+    columns = {
+        "level": "Level", "group": "Group", "sales": "Sales", "profit": "Profit", "margin": "Margin",
+        "sales_share": "Sales Share", "discount_impact": "Discount Impact (margin)", "discount_cost": "Discount Cost",
+    }
+    for tab, key in zip(
+        st.tabs(["⚠️ Losses", "💸 Discounts", "💡 Leaders", "🧊 All Groups"]),
+        ["losses", "discounts", "leaders", "cube"],
+    ):
+        tab.dataframe(
+            opportunities[key][list(columns)].rename(columns=columns).style.format({
+                "Sales": "${:,.0f}", "Profit": "${:,.0f}", "Margin": "{:.1%}", "Sales Share": "{:.1%}",
+                "Discount Impact (margin)": "{:+.1%}", "Discount Cost": "${:,.0f}",
+            }),
+            use_container_width=True,
+            hide_index=True,
+        )
 
 # Run Forecast
 st.subheader("📊 Revenue Forecast Simulator")
 periods = st.slider("Select forecast horizon (months)", 1, 24, 6)
-forecast_df = run_forecast(df, periods)
+forecast_df, forecast_timings = run_forecast(df, periods)
 
 fig = plot_forecast(forecast_df)
 st.plotly_chart(fig, use_container_width=True)
+st.caption(
+    f"⏱️ Fit: {forecast_timings['fit']:.2f}s{' (cached)' if forecast_timings['cached'] else ''} · "
+    f"Predict: {forecast_timings['predict']:.2f}s"
+)
+
+# Hierarchical Forecast
+with st.expander("🧩 Forecast by Region & Category"):
+    st.write("Forecasts every Region, Category and Sub-Category in parallel, reconciled so each level sums to the total.")
+    if st.toggle("Run hierarchical forecast"):
+        hierarchy_df, hierarchy_timings = run_hierarchical_forecast(df, periods)
+        level = st.selectbox("Level", hierarchy_df['level'].unique().tolist(), index=1)
+        st.plotly_chart(plot_hierarchy(hierarchy_df, level), use_container_width=True)
+        st.caption(
+            f"⏱️ {hierarchy_timings['series']} series in {hierarchy_timings['wall']:.1f}s · "
+            f"refitted {hierarchy_timings['refitted']} ({hierarchy_timings['fit']:.1f}s) · "
+            f"predict {hierarchy_timings['predict']:.1f}s · reconcile {hierarchy_timings['reconcile']:.2f}s"
+        )
 
 # Generate Action Plan with Gemini
 if st.button("🤖 Generate AI-Powered Action Plan"):
     if 'opportunities' not in locals():
         opportunities = detect_opportunities(df)
-    plan = generate_action_plan(opportunities)
     st.subheader("✅ Recommended Action Plan")
-    st.write(plan)
+    # Shown as it is generated; the same opportunities are answered from the cache
+    plan = st.write_stream(stream_action_plan(format_opportunities(opportunities)))
 
     st.download_button("📥 Download Action Plan", plan, file_name="action_plan.txt")
 
@@ -1,21 +1,186 @@
 # modules/forecast.py
 
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
 import pandas as pd
 from prophet import Prophet
 
-def run_forecast(df: pd.DataFrame, periods: int):
+# Enough for every series of the hierarchy of a few datasets
+MODEL_CACHE_ENTRIES = 512
+FORECAST_CACHE_ENTRIES = 512
+WORKERS = os.cpu_count() or 1
+BOTTOM_LEVEL = "Region × Sub-Category"
+
+_models = OrderedDict()
+_models_lock = threading.Lock()
+_forecasts = OrderedDict()
+_forecasts_lock = threading.Lock()
+
+
+def daily_sales(df: pd.DataFrame):
     """
-    Forecasts overall sales using Prophet.
-    Groups sales by Order Date.
+    Total sales per Order Date, as the ds / y frame Prophet expects.
+    """
+    daily_sales = df.groupby(pd.to_datetime(df['Order Date']))['Sales'].sum().reset_index()
+    return daily_sales.rename(columns={'Order Date': 'ds', 'Sales': 'y'})
+
+
+def sales_fingerprint(daily_sales: pd.DataFrame):
+    hashes = pd.util.hash_pandas_object(daily_sales, index=False).values
+    return hashlib.blake2b(hashes.tobytes(), digest_size=16).hexdigest()
+
+
+def get_model(daily_sales: pd.DataFrame, key: str):
     """
-    df['Order Date'] = pd.to_datetime(df['Order Date'])
-    daily_sales = df.groupby('Order Date')['Sales'].sum().reset_index()
-    daily_sales = daily_sales.rename(columns={'Order Date': 'ds', 'Sales': 'y'})
+    Returns the Prophet model fitted on daily_sales, its fit time and whether it came from the cache.
+    Models are cached by key, a fingerprint of the data, so only new data is refitted.
+    """
+    with _models_lock:
+        if key in _models:
+            _models.move_to_end(key)
+            model, fit_seconds = _models[key]
+            return model, fit_seconds, True
 
+    start = time.perf_counter()
     model = Prophet()
     model.fit(daily_sales)
+    fit_seconds = time.perf_counter() - start
+
+    with _models_lock:
+        _models[key] = (model, fit_seconds)
+        while len(_models) > MODEL_CACHE_ENTRIES:
+            _models.popitem(last=False)
+    return model, fit_seconds, False
+
+
+def forecast_series(daily_sales: pd.DataFrame, periods: int):
+    """
+    Fits (or reuses) the model of one series and predicts periods months ahead.
+    Forecasts are cached per series and horizon as well.
+    Returns the forecast, the fit seconds, whether the fit was cached and the
+    predict seconds (0 for a cached forecast).
+    """
+    key = sales_fingerprint(daily_sales)
+    model, fit_seconds, cached = get_model(daily_sales, key)
 
+    with _forecasts_lock:
+        forecast = _forecasts.get((key, periods))
+        if forecast is not None:
+            _forecasts.move_to_end((key, periods))
+            return forecast, fit_seconds, cached, 0.0
+
+    start = time.perf_counter()
     future = model.make_future_dataframe(periods=periods, freq='M')
-    forecast = model.predict(future)
+    forecast = model.predict(future)[['ds', 'yhat', 'yhat_lower', 'yhat_upper']]
+    predict_seconds = time.perf_counter() - start
+
+    with _forecasts_lock:
+        _forecasts[(key, periods)] = forecast
+        while len(_forecasts) > FORECAST_CACHE_ENTRIES:
+            _forecasts.popitem(last=False)
+    return forecast, fit_seconds, cached, predict_seconds
+
+
+def run_forecast(df: pd.DataFrame, periods: int):
+    """
+    Forecasts overall sales using Prophet.
+    Groups sales by Order Date. Changing only the horizon reuses the fitted model.
+    Returns the forecast and a dict of fit / predict seconds and whether the fit was cached.
+    df is not modified.
+    """
+    forecast, fit_seconds, cached, predict_seconds = forecast_series(daily_sales(df), periods)
+
+    timings = {"fit": fit_seconds, "predict": predict_seconds, "cached": cached}
+    return forecast, timings
+
+
+# -------------------------------
+# Hierarchical forecasts
+# -------------------------------
+def hierarchy_series(df: pd.DataFrame):
+    """
+    Daily sales of every series of the hierarchy on one zero-filled calendar.
+    The bottom series are Region × Sub-Category; the total, each Region, Category
+    and Sub-Category are sums of them, as given by the summing matrix.
+    Returns the (level, name) of every series, the summing matrix and the
+    daily sales (days × series).
+    """
+    order_date = pd.to_datetime(df['Order Date'])
+    bottom = (
+        df.groupby([order_date, 'Region', 'Sub-Category'], observed=True)['Sales'].sum()
+        .unstack(['Region', 'Sub-Category'], fill_value=0)
+        .sort_index(axis=1)
+    )
+    bottom = bottom.reindex(pd.date_range(bottom.index.min(), bottom.index.max(), freq='D'), fill_value=0)
+
+    regions = bottom.columns.get_level_values('Region')
+    sub_categories = bottom.columns.get_level_values('Sub-Category')
+    category_of = df.groupby('Sub-Category', observed=True)['Category'].first()
+    categories = category_of.reindex(sub_categories).values
+
+    rows = [(("Total", "Total"), np.ones(len(bottom.columns)))]
+    for level, members in (("Region", regions), ("Category", categories), ("Sub-Category", sub_categories)):
+        rows += [((level, name), np.asarray(members == name, dtype=float)) for name in sorted(set(members))]
+    rows += [((BOTTOM_LEVEL, f"{region} / {sub_category}"), np.eye(len(bottom.columns))[i])
+             for i, (region, sub_category) in enumerate(bottom.columns)]
+
+    series = [name for name, _ in rows]
+    summing = np.vstack([row for _, row in rows])
+    return series, summing, pd.DataFrame(bottom.values @ summing.T, index=bottom.index)
+
+
+def reconcile(summing: np.ndarray, base: np.ndarray):
+    """
+    OLS reconciliation: the coherent forecasts (series × steps) closest to the base ones.
+    Every aggregate of the result is exactly the sum of its bottom series.
+    """
+    bottom, *_ = np.linalg.lstsq(summing, base, rcond=None)
+    return summing @ bottom
+
+
+def run_hierarchical_forecast(df: pd.DataFrame, periods: int, workers: int = WORKERS):
+    """
+    Forecasts the total, every Region, Category, Sub-Category and Region × Sub-Category
+    series in parallel and reconciles them so that every level sums to the total.
+    Models are cached per series, so new data only refits the series it changes.
+    Returns a long forecast (level, series, ds, yhat, yhat_lower, yhat_upper) and timings.
+    """
+    start = time.perf_counter()
+    series, summing, sales = hierarchy_series(df)
+    inputs = [pd.DataFrame({'ds': sales.index, 'y': sales[i].values}) for i in range(len(series))]
+
+    # Fitting runs in CmdStan subprocesses, so threads keep all cores busy and share the model cache
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(forecast_series, inputs, [periods] * len(inputs)))
+
+    reconcile_start = time.perf_counter()
+    base = np.vstack([forecast['yhat'].values for forecast, _, _, _ in results])
+    adjustment = reconcile(summing, base) - base
+    frames = []
+    for (level, name), (forecast, _, _, _), shift in zip(series, results, adjustment):
+        # Intervals keep their width around the reconciled forecast
+        frames.append(forecast.assign(
+            level=level,
+            series=name,
+            yhat=forecast['yhat'] + shift,
+            yhat_lower=forecast['yhat_lower'] + shift,
+            yhat_upper=forecast['yhat_upper'] + shift,
+        ))
+    forecast = pd.concat(frames, ignore_index=True)[['level', 'series', 'ds', 'yhat', 'yhat_lower', 'yhat_upper']]
 
-    return forecast[['ds', 'yhat', 'yhat_lower', 'yhat_upper']]
+    refitted = [fit_seconds for _, fit_seconds, cached, _ in results if not cached]
+    timings = {
+        "fit": sum(refitted),
+        "predict": sum(predict_seconds for _, _, _, predict_seconds in results),
+        "reconcile": time.perf_counter() - reconcile_start,
+        "wall": time.perf_counter() - start,
+        "series": len(series),
+        "refitted": len(refitted),
+    }
+    return forecast, timings
@@ -1,15 +1,97 @@
 # modules/generator.py
 
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
 import google.generativeai as genai
 
-# Replace with your Gemini API key
-genai.configure(api_key="")
+MODEL_NAME = "gemini-2.0-flash"
+# Plans are reused for the same opportunities for this long
+PLAN_TTL = 60 * 60
+PLAN_CACHE_ENTRIES = 64
+# Set GEMINI_FAKE=1 to use the offline FakeModel instead of the Gemini API
+USE_FAKE_MODEL = os.environ.get("GEMINI_FAKE") == "1"
 
-def generate_action_plan(opportunities: str):
+# Replace with your Gemini API key (or set GEMINI_API_KEY)
+genai.configure(api_key=os.environ.get("GEMINI_API_KEY", ""))
+
+_model = None
+_model_lock = threading.Lock()
+_plans = OrderedDict()
+_plans_lock = threading.Lock()
+
+
+class FakeModel:
+    """
+    Offline stand-in for genai.GenerativeModel: streams a canned plan built from the prompt.
+    """
+
+    def __init__(self, chunk_delay=0.05):
+        self.chunk_delay = chunk_delay
+        self.calls = 0
+
+    def _chunks(self, prompt):
+        lines = [line.strip() for line in prompt.splitlines() if line.strip().startswith("- ")]
+        yield "## Action Plan (offline)\n\n"
+        for step, line in enumerate(lines, 1):
+            time.sleep(self.chunk_delay)
+            yield f"{step}. Address {line[2:]}\n"
+
+    def generate_content(self, prompt, stream=False):
+        self.calls += 1
+        if stream:
+            # Chunks are produced as they are consumed, like the streamed API response
+            return (_FakeResponse(text) for text in self._chunks(prompt))
+        return _FakeResponse("".join(self._chunks(prompt)))
+
+
+class _FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+def get_model():
     """
-    Uses Google Gemini 1.5 Flash to generate a business action plan.
+    The model client is created once per process and shared.
     """
-    model = genai.GenerativeModel("gemini-2.0-flash")
+    global _model
+    with _model_lock:
+        if _model is None:
+            _model = FakeModel() if USE_FAKE_MODEL else genai.GenerativeModel(MODEL_NAME)
+        return _model
+
+
+def get_cached_plan(key):
+    with _plans_lock:
+        now = time.monotonic()
+        # Entries are in insertion order, so the expired ones are at the front
+        while _plans and next(iter(_plans.values()))[1] <= now:
+            _plans.popitem(last=False)
+        entry = _plans.get(key)
+        return None if entry is None or entry[1] <= now else entry[0]
+
+
+def cache_plan(key, plan):
+    with _plans_lock:
+        _plans.pop(key, None)
+        _plans[key] = (plan, time.monotonic() + PLAN_TTL)
+        while len(_plans) > PLAN_CACHE_ENTRIES:
+            _plans.popitem(last=False)
+
+
+def stream_action_plan(opportunities: str):
+    """
+    Uses Google Gemini 2.0 Flash to generate a business action plan, yielding text as it arrives.
+    Plans are cached by a hash of the opportunities; a cached plan is yielded at once.
+    """
+    key = hashlib.sha256(opportunities.encode()).hexdigest()
+    plan = get_cached_plan(key)
+    if plan is not None:
+        yield plan
+        return
 
     prompt = f"""
     You are an expert business consultant.
@@ -22,7 +104,17 @@ def generate_action_plan(opportunities: str):
     - Tips to boost profit for loss-making areas
     """
 
-    response = model.generate_content(prompt)
+    chunks = []
+    for chunk in get_model().generate_content(prompt, stream=True):
+        chunks.append(chunk.text)
+        yield chunk.text
+
+    # Only complete plans are cached, an interrupted stream is generated again
+    cache_plan(key, "".join(chunks).strip())
+
 
-    plan = response.text.strip()
-    return plan
+def generate_action_plan(opportunities: str):
+    """
+    The whole plan at once, see stream_action_plan.
+    """
+    return "".join(stream_action_plan(opportunities)).strip()
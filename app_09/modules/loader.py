@@ -0,0 +1,77 @@
+# modules/loader.py
+
+import hashlib
+import io
+import os
+
+import pandas as pd
+
+CACHE_DIR = "data/.cache"
+DROP_COLUMNS = ["A`"]
+DATE_COLUMNS = ["Order Date", "Ship Date"]
+CATEGORY_COLUMNS = ["Ship Mode", "Segment", "Country/Region", "City", "State", "Region", "Category", "Sub-Category"]
+
+
+def content_hash(data: bytes):
+    return hashlib.sha256(data).hexdigest()[:16]
+
+
+def parse_excel(data: bytes):
+    """
+    Parses a Superstore export into a typed frame: dates parsed, low-cardinality text as categories.
+    """
+    df = pd.read_excel(io.BytesIO(data))
+    # Drop unwanted columns if they exist
+    df = df.drop(columns=[col for col in df.columns if col.strip() in DROP_COLUMNS], errors='ignore')
+    for col in DATE_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col])
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype("category")
+    return df
+
+
+def read_only(df: pd.DataFrame):
+    """
+    The same frame backed by read-only arrays: writes raise instead of changing data shared between reruns.
+    """
+    columns = {}
+    for name, column in df.items():
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            codes = column.cat.codes.to_numpy().copy()
+            codes.flags.writeable = False
+            columns[name] = pd.Categorical.from_codes(codes, dtype=column.dtype)
+        else:
+            values = column.to_numpy().copy()
+            values.flags.writeable = False
+            columns[name] = values
+    return pd.DataFrame(columns, index=df.index, copy=False)
+
+
+def load_superstore(data: bytes, key: str = None, cache_dir: str = CACHE_DIR):
+    """
+    Returns the typed, read-only frame of an Excel export.
+    Each distinct file is parsed once and kept as Parquet named by its content hash.
+    """
+    key = key or content_hash(data)
+    cache_path = os.path.join(cache_dir, f"superstore-{key}.parquet")
+    if os.path.exists(cache_path):
+        return read_only(pd.read_parquet(cache_path))
+
+    df = parse_excel(data)
+    try:
+        import pyarrow
+    except ImportError:
+        # No parquet engine: parse the Excel file again next time
+        return read_only(df)
+
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        df.to_parquet(cache_path + ".tmp", index=False)
+        os.replace(cache_path + ".tmp", cache_path)
+    except (pyarrow.ArrowTypeError, pyarrow.ArrowInvalid, OSError):
+        # Mixed-type columns or a read-only folder: the parsed frame is still good
+        if os.path.exists(cache_path + ".tmp"):
+            os.remove(cache_path + ".tmp")
+    return read_only(df)
@@ -1,22 +1,151 @@
 # modules/opportunity.py
 
+from itertools import combinations
+
+import numpy as np
 import pandas as pd
 
-def detect_opportunities(df: pd.DataFrame):
+DIMENSIONS = ("Region", "State", "Segment", "Ship Mode", "Category", "Sub-Category")
+TOP_N = 10
+MISSING = "(missing)"
+
+
+def build_cube(df: pd.DataFrame, dimensions=DIMENSIONS):
+    """
+    One pass over the order lines: sums per combination of all dimensions present.
+    Returns the labels of every dimension, the codes of every cell (cells × dimensions)
+    and the measures of every cell.
+    """
+    labels, codes = [], []
+    for dimension in dimensions:
+        # Missing values get a code of their own instead of -1, which would corrupt the cell ids
+        dimension_codes, dimension_labels = pd.factorize(df[dimension], sort=True, use_na_sentinel=False)
+        codes.append(dimension_codes)
+        labels.append(dimension_labels.astype(object).fillna(MISSING))
+
+    # Mixed-radix cell id, so grouping is a single 1-D unique + bincount
+    sizes = np.array([len(dimension_labels) for dimension_labels in labels], dtype=np.int64)
+    row_keys = np.zeros(len(df), dtype=np.int64)
+    for dimension_codes, size in zip(codes, sizes):
+        row_keys = row_keys * size + dimension_codes
+    cell_keys, cell_of_row = np.unique(row_keys, return_inverse=True)
+
+    cell_codes = np.empty((len(cell_keys), len(dimensions)), dtype=np.int64)
+    remainder = cell_keys
+    for i in range(len(dimensions) - 1, -1, -1):
+        remainder, cell_codes[:, i] = np.divmod(remainder, sizes[i])
+
+    sales = df['Sales'].to_numpy(dtype=float)
+    profit = df['Profit'].to_numpy(dtype=float)
+    discounted = df['Discount'].to_numpy(dtype=float) > 0
+    measures = {
+        "orders": np.bincount(cell_of_row, minlength=len(cell_keys)),
+        "sales": np.bincount(cell_of_row, weights=sales, minlength=len(cell_keys)),
+        "profit": np.bincount(cell_of_row, weights=profit, minlength=len(cell_keys)),
+        "discounted_sales": np.bincount(cell_of_row, weights=sales * discounted, minlength=len(cell_keys)),
+        "discounted_profit": np.bincount(cell_of_row, weights=profit * discounted, minlength=len(cell_keys)),
+    }
+    return labels, cell_codes, measures
+
+
+def rollup(labels, cell_codes, measures, columns):
+    """
+    Sums the cube cells over every dimension not in columns (indices into the cube dimensions).
+    Returns the group labels and measures.
+    """
+    sizes = [len(labels[column]) for column in columns]
+    keys = np.zeros(len(cell_codes), dtype=np.int64)
+    for column, size in zip(columns, sizes):
+        keys = keys * size + cell_codes[:, column]
+    group_keys, group_of_cell = np.unique(keys, return_inverse=True)
+
+    names = []
+    remainder = group_keys
+    for column, size in zip(reversed(columns), reversed(sizes)):
+        remainder, group_codes = np.divmod(remainder, size)
+        names.insert(0, labels[column][group_codes].astype(str))
+    groups = names[0] if len(names) == 1 else [" / ".join(parts) for parts in zip(*names)]
+
+    totals = {name: np.bincount(group_of_cell, weights=values, minlength=len(group_keys))
+              for name, values in measures.items()}
+    return groups, totals
+
+
+def detect_opportunities(df: pd.DataFrame, dimensions=DIMENSIONS, top: int = TOP_N):
+    """
+    Scans every dimension and dimension pair for profit, margin, discount impact and sales share.
+    Returns a dict of ranked frames:
+    - "losses": loss-making groups, biggest loss first
+    - "discounts": groups whose discounted sales earn the least next to their full-price sales,
+      ranked by the profit discounting costs them
+    - "leaders": highest-sales groups of the single dimensions
+    - "cube": every group of every level
+    """
+    labels, cell_codes, measures = build_cube(df, dimensions)
+    total_sales = measures["sales"].sum()
+
+    levels = [(column,) for column in range(len(dimensions))]
+    for pair in combinations(range(len(dimensions)), 2):
+        # Skip nested pairs (State in Region, Sub-Category in Category): they repeat a single level
+        pair_groups = len(np.unique(cell_codes[:, pair], axis=0))
+        if pair_groups > max(len(np.unique(cell_codes[:, column])) for column in pair):
+            levels.append(pair)
+
+    frames = []
+    for columns in levels:
+        groups, totals = rollup(labels, cell_codes, measures, columns)
+        frames.append(pd.DataFrame({
+            "level": " × ".join(dimensions[column] for column in columns),
+            "group": groups,
+            **totals,
+        }))
+    cube = pd.concat(frames, ignore_index=True)
+
+    full_price_sales = cube["sales"] - cube["discounted_sales"]
+    full_price_margin = (cube["profit"] - cube["discounted_profit"]) / full_price_sales.where(full_price_sales > 0)
+    discounted_margin = cube["discounted_profit"] / cube["discounted_sales"].where(cube["discounted_sales"] > 0)
+    cube = cube.assign(
+        margin=cube["profit"] / cube["sales"],
+        sales_share=cube["sales"] / total_sales,
+        discount_share=cube["discounted_sales"] / cube["sales"],
+        # Margin points lost on discounted sales, and the profit that costs at this group's sales
+        discount_impact=discounted_margin - full_price_margin,
+        discount_cost=((full_price_margin - discounted_margin) * cube["discounted_sales"]).clip(lower=0).fillna(0),
+    ).drop(columns=["discounted_sales", "discounted_profit"])
+
+    single = cube["level"].isin(dimensions)
+    return {
+        "losses": cube[cube["profit"] < 0].sort_values("profit").head(top).reset_index(drop=True),
+        "discounts": cube[cube["discount_cost"] > 0].sort_values("discount_cost", ascending=False).head(top)
+        .reset_index(drop=True),
+        "leaders": cube[single].sort_values("sales", ascending=False).head(top).reset_index(drop=True),
+        "cube": cube,
+    }
+
+
+def format_opportunities(opportunities: dict):
     """
-    Example: Detect low-profit sub-categories for improvement.
+    Plain-text summary of detect_opportunities, e.g. for the action plan prompt.
     """
-    profit_by_subcategory = df.groupby('Sub-Category')['Profit'].sum().sort_values()
-    loss_making = profit_by_subcategory[profit_by_subcategory < 0]
+    def describe(row):
+        return (f"- {row.level}: {row.group} — sales ${row.sales:,.0f} ({row.sales_share:.1%} of total), "
+                f"profit ${row.profit:,.0f}, margin {row.margin:.1%}")
 
-    opportunities = ""
-    if not loss_making.empty:
-        opportunities += "⚠️ Loss-making sub-categories:\n"
-        opportunities += loss_making.to_string()
+    text = ""
+    if not opportunities["losses"].empty:
+        text += "⚠️ Loss-making groups:\n"
+        text += "\n".join(describe(row) for row in opportunities["losses"].itertuples())
     else:
-        opportunities += "✅ All sub-categories are profitable!"
+        text += "✅ All groups are profitable!"
 
-    high_sales_region = df.groupby('Region')['Sales'].sum().idxmax()
-    opportunities += f"\n\n💡 Highest sales region: {high_sales_region}"
+    if not opportunities["discounts"].empty:
+        text += "\n\n💸 Discounts eroding profit:\n"
+        text += "\n".join(
+            f"{describe(row)}, discounted sales earn {row.discount_impact * 100:+.1f} margin points vs full price "
+            f"(≈ ${row.discount_cost:,.0f} profit)"
+            for row in opportunities["discounts"].itertuples()
+        )
 
-    return opportunities
+    text += "\n\n💡 Highest sales groups:\n"
+    text += "\n".join(describe(row) for row in opportunities["leaders"].itertuples())
+    return text
@@ -30,3 +30,17 @@ def plot_forecast(forecast_df: pd.DataFrame):
 
     fig.update_layout(title="Sales Forecast", xaxis_title="Date", yaxis_title="Sales ($)")
     return fig
+
+
+def plot_hierarchy(forecast_df: pd.DataFrame, level: str):
+    fig = go.Figure()
+    for series, series_df in forecast_df[forecast_df['level'] == level].groupby('series'):
+        fig.add_trace(go.Scatter(
+            x=series_df['ds'],
+            y=series_df['yhat'],
+            mode='lines',
+            name=series
+        ))
+
+    fig.update_layout(title=f"Sales Forecast by {level}", xaxis_title="Date", yaxis_title="Sales ($)")
+    return fig